@@ -0,0 +1,147 @@
+# calibrate.py
+#
+# Step-rate auto-calibration
+#
+# usage: python calibrate.py [--axes 2] [--margin 1.5] [--word W]
+#   (or POST /admin/calibrate on the running server, which also applies it)
+#
+# Measures on this box, in a forked process like the motor processes:
+#   - what shifting out one word really costs (p50/p99),
+#   - how late time.sleep() wakes up (scheduler jitter, p50/p99),
+#   - what starting and joining a move process costs.
+# From those it works out the fastest step period each axis can hold with a
+# safety margin, given how many axes step at once (each may need its own
+# shift and wake-up within one period), and never faster than the motor
+# itself follows (half-stepping, the only sequence Stepper drives). The
+# acceleration is set so the first step of a ramp starts no faster than the
+# motor can start from rest.
+# The fixed cost per move and the typical cost per step on top of its
+# period are reported as well, so move time predictions can include them.
+#
+# Re-sending the word already latched in the register does not move the
+# coils, so measuring from the server (which knows that word) is safe with
+# the motors attached. Run on its own, this script cannot know it: it shifts
+# out --word, by default 0, which switches every coil off and lets loaded
+# axes slip, so run it with the motors idle or pass the word they hold.
+
+import argparse
+import multiprocessing
+import time
+
+# Limits of the 28BYJ-48 on a 595 + ULN2003 [us]
+FASTEST_PERIOD_US = 1000    # fastest half-step period the 28BYJ-48 follows
+START_PERIOD_US = 2000      # fastest half-step period it starts from rest at
+SLEEP_PROBE_US = 500        # sleep length used to measure wake-up jitter
+MOVE_SAMPLES = 10           # move processes started to time the per-move cost
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+# Shift cost and sleep overshoot [us] on this process
+def measure(shifter, word, samples, bits=8):
+    shifts = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        shifter.shiftWord(word, bits)
+        shifts.append((time.perf_counter() - t0) * 1e6)
+
+    late = []
+    for _ in range(samples // 4):
+        t0 = time.perf_counter()
+        time.sleep(SLEEP_PROBE_US / 1e6)
+        late.append((time.perf_counter() - t0) * 1e6 - SLEEP_PROBE_US)
+
+    return {"shift_p50_us": round(_percentile(shifts, 50), 1),
+            "shift_p99_us": round(_percentile(shifts, 99), 1),
+            "jitter_p50_us": round(max(0.0, _percentile(late, 50)), 1),
+            "jitter_p99_us": round(max(0.0, _percentile(late, 99)), 1)}
+
+
+def _measureChild(conn, shifter, word, samples, bits):
+    conn.send(measure(shifter, word, samples, bits))
+    conn.close()
+
+
+# Measure in a forked process, where the step loop really runs
+def measureForked(shifter, word=0, samples=2000, bits=8):
+    parent, child = multiprocessing.Pipe(duplex=False)
+    p = multiprocessing.Process(target=_measureChild, args=(child, shifter, word, samples, bits))
+    p.start()
+    result = parent.recv()
+    p.join()
+    return result
+
+
+def _idle():
+    pass
+
+
+# Cost of starting and joining one move process [us], p50
+def measureMove(samples=MOVE_SAMPLES):
+    costs = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        p = multiprocessing.Process(target=_idle)
+        p.start()
+        p.join()
+        costs.append((time.perf_counter() - t0) * 1e6)
+    return round(_percentile(costs, 50), 1)
+
+
+# Step period [us] and acceleration [deg/s^2] for one axis from its measurements
+def profile(measured, axes, margin, steps_per_degree):
+    fastest, start = FASTEST_PERIOD_US, START_PERIOD_US
+    cpu = margin * (axes * measured["shift_p99_us"] + measured["jitter_p99_us"])
+    period = max(float(fastest), cpu)
+
+    # rampPeriods' first step takes 1/sqrt(2a); make that the start period
+    if period >= start:
+        accel = 0.0     # the motor can start at full speed
+    else:
+        accel = 1 / (2 * (start / 1e6) ** 2) / steps_per_degree
+    return dict(measured, period_us=round(period, 1), accel=round(accel, 1),
+                step_overhead_us=round(measured["shift_p50_us"] + measured["jitter_p50_us"], 1),
+                cpu_limited=cpu > fastest)
+
+
+# Calibrate every axis (one shifter and current output word each) and
+# return per-axis results plus the profile they can all share
+def calibrate(axisShifters, words, axes=1, margin=1.5,
+              steps_per_degree=4096/360, samples=2000, bits=8):
+    measured = {}   # shifters are shared between axes, measure each once
+    results = []
+    for shifter, word in zip(axisShifters, words):
+        if id(shifter) not in measured:
+            measured[id(shifter)] = measureForked(shifter, word, samples, bits)
+        results.append(profile(measured[id(shifter)], axes, margin, steps_per_degree))
+
+    accels = [r["accel"] for r in results if r["accel"]]
+    return {
+        "axes": axes,
+        "margin": margin,
+        "perAxis": results,
+        "delay": max(r["period_us"] for r in results),     # the slowest axis sets the shared rate
+        "accel": min(accels) if accels else 0.0,
+        "move_overhead": measureMove(),
+        "step_overhead": max(r["step_overhead_us"] for r in results),
+    }
+
+
+if __name__ == "__main__":
+    from shifter import Shifter
+
+    parser = argparse.ArgumentParser(description="Measure the fastest safe step rate on this box")
+    parser.add_argument("--axes", type=int, default=1, help="axes stepping at the same time")
+    parser.add_argument("--margin", type=float, default=1.5)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--word", type=lambda text: int(text, 0), default=0,
+                        help="word to shift out (default 0 switches every coil off)")
+    args = parser.parse_args()
+
+    s = Shifter(data=14, latch=15, clock=18)
+    result = calibrate([s], [args.word], args.axes, args.margin, samples=args.samples)
+    for key, value in result.items():
+        print(f"{key}: {value}")
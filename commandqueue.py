@@ -0,0 +1,109 @@
+# commandqueue.py
+#
+# Single ordered command queue
+#
+# Every motion and laser command runs on one worker thread, in the order it
+# was submitted, so two clients can never fight over the motors or the
+# globals that go with them. The queue is bounded: once it is full, submit()
+# raises QueueFull and the caller should tell its client to back off instead
+# of piling up more work behind the motors.
+#
+# Commands can carry a coalescing key (e.g. one per motor axis). A new
+# command with the same key as the last command waiting replaces it, latest
+# wins, and the replaced command's future raises Superseded. A keyed command
+# with anything queued after it is left alone, so commands always run in the
+# order they were submitted - except that keys declared independent (e.g.
+# the two axes: a bed move and a laser move end in the same pose in either
+# order) do not block each other, so alternating bed/laser clicks still
+# coalesce to one pending move per axis. Bursts of clicks then cost one
+# move to the final pose, not one per click.
+
+import threading
+import collections
+from concurrent.futures import Future
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Superseded(Exception):
+    pass
+
+
+class CommandQueue:
+    """
+    Runs submitted functions one at a time on a single worker thread.
+
+    submit() returns a concurrent.futures.Future that resolves to the
+    function's return value (or raises its exception), so it can be awaited
+    from asyncio with asyncio.wrap_future().
+    """
+
+    def __init__(self, maxsize=16, independent=()):
+        self.maxsize = maxsize
+        self.independent = set(independent)     # keys whose commands commute with each other
+        self.q = collections.deque()    # pending [fn, args, future, key] entries
+        self.keyed = {}                 # coalescing key -> its pending entry
+        self.cond = threading.Condition()
+        self.thread = None
+
+    # Start the worker thread (safe to call more than once)
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run, name="commands", daemon=True)
+            self.thread.start()
+
+    # Queue fn(*args) and return a Future for its result. If key is given and
+    # a command with the same key is waiting with nothing queued after it but
+    # commands it commutes with, the new one takes its place.
+    def submit(self, fn, *args, key=None):
+        future = Future()
+        with self.cond:
+            old = self.keyed.get(key) if key is not None else None
+            if old is not None and self.__replaceable(old):
+                # Replacing a command further up would otherwise run the new
+                # one ahead of commands submitted in between (a zero or a
+                # laser toggle, say)
+                self.q.remove(old)
+                if not old[2].cancelled():
+                    old[2].set_exception(Superseded(f"replaced by a newer {key} command"))
+            elif len(self.q) >= self.maxsize:
+                raise QueueFull(f"{self.maxsize} commands already waiting")
+            entry = [fn, args, future, key]
+            self.q.append(entry)
+            if key is not None:
+                self.keyed[key] = entry
+            self.cond.notify()
+        return future
+
+    # True if only commands independent of old's key are queued after it
+    def __replaceable(self, old):
+        for entry in reversed(self.q):
+            if entry is old:
+                return True
+            key = entry[3]
+            if old[3] not in self.independent or key not in self.independent or key == old[3]:
+                return False
+        return False
+
+    # Number of commands waiting to run
+    def pending(self):
+        with self.cond:
+            return len(self.q)
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while not self.q:
+                    self.cond.wait()
+                entry = self.q.popleft()
+                fn, args, future, key = entry
+                if key is not None and self.keyed.get(key) is entry:
+                    del self.keyed[key]
+            if not future.set_running_or_notify_cancel():
+                continue    # cancelled while waiting
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
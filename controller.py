@@ -0,0 +1,187 @@
+# controller.py
+#
+# N-axis stepper controller
+#
+# Drives any number of stepper axes spread over any number of shift register
+# chains (one Shifter each, with one or more daisy-chained 595s behind it).
+# Each axis takes the next free 4 outputs on its chain, so one 595 holds two
+# motors and a chain of R registers holds 2R.
+#
+# A move of several axes runs in a single scheduler process, not one process
+# per motor. The scheduler keeps every axis' step times on one clock; at each
+# tick it steps all axes that are due, then shifts each chain that changed
+# exactly once, so every chain is updated in the same pass. Chains on a
+# ParallelShifter are lanes of one bus (own data pin, shared clock and
+# latch) and are all shifted together in a single pass of the clock. Coil phases,
+# chain words and angles live in shared memory, so they carry over from one
+# move process to the next.
+#
+# The server's Stepper drives the two axes on its one register itself (and
+# refuses a third); this controller is for rigs with more axes than that.
+#
+# Example (two chains, three registers, five axes):
+#
+#   c = MotionController()
+#   front = c.addChain(Shifter(data=14, latch=15, clock=18), registers=2)
+#   head = c.addChain(Shifter(data=16, latch=20, clock=21), registers=1)
+#   bed, laser, turret = c.addAxis(front), c.addAxis(front), c.addAxis(front)
+#   pan, tilt = c.addAxis(head), c.addAxis(head)
+#   c.move({pan: 30, tilt: -10, bed: 45})   # all three at once
+
+import math
+import multiprocessing
+import time
+
+SEQ = [0b0001,0b0011,0b0010,0b0110,0b0100,0b1100,0b1000,0b1001] # CCW half-step sequence
+
+
+# Step periods [s] for a run of n steps from rest to rest: as fast as the
+# acceleration limit accel [deg/s^2] allows, never faster than delay [us].
+# accel = 0 steps at the full rate from the first step.
+def rampPeriods(n, delay, accel, steps_per_degree):
+    fastest = delay/1e6
+    if not accel:
+        return [fastest] * n
+    a = accel * steps_per_degree    # [steps/s^2]
+    return [max(fastest, 1 / math.sqrt(2 * a * min(k + 1, n - k))) for k in range(n)]
+
+
+class Chain:
+    """One Shifter (or one lane of a ParallelShifter) and the 595s behind it."""
+
+    def __init__(self, shifter, registers=1, lane=None):
+        if not 1 <= registers <= 8:
+            raise ValueError("a chain holds 1 to 8 registers (64 outputs)")
+        self.shifter = shifter
+        self.lane = lane        # data pin index on a ParallelShifter, else None
+        self.bits = 8 * registers
+        self.word = multiprocessing.RawValue('Q', 0)   # current outputs of the whole chain
+        self.axes = 0                                   # axes placed on this chain so far
+
+
+class Axis:
+    """One motor: four outputs on a chain, its coil phase and its angle."""
+
+    def __init__(self, chain, slot, limit=80, steps_per_degree=4096/360):
+        self.chain = chain
+        self.bit_start = 4 * slot
+        self.limit = limit                  # travel range +/-limit [deg]
+        self.steps_per_degree = steps_per_degree
+        self.angle = multiprocessing.Value('d', 0.0)    # unwrapped shaft angle [deg]
+        self.phase = multiprocessing.RawValue('i', 0)   # position in SEQ
+
+    # Advance one step in direction dir and update the chain word (not shifted yet)
+    def step(self, dir):
+        self.phase.value = (self.phase.value + dir) % 8
+        mask = 0b1111 << self.bit_start
+        word = self.chain.word
+        word.value = (word.value & ~mask) | (SEQ[self.phase.value] << self.bit_start)
+        self.angle.value += dir / self.steps_per_degree
+
+    # (direction, steps) to get to an absolute angle, clamped to the travel range
+    def stepsTo(self, tarAngle):
+        tarAngle = max(-self.limit, min(self.limit, tarAngle))
+        delta = tarAngle - self.angle.value
+        return (1 if delta > 0 else -1), int(self.steps_per_degree * abs(delta))
+
+
+class MotionController:
+    """Moves any set of axes together from one scheduler process."""
+
+    def __init__(self, delay=2500, accel=0, lock=None):
+        self.delay = delay      # shortest step period [us]
+        self.accel = accel      # acceleration limit [deg/s^2], 0 = none
+        self.lock = lock or multiprocessing.Lock()
+        self.chains = []
+        self.axes = []
+        self.lanes = {}         # ParallelShifter -> its chains, in data pin order
+
+    # A chain on shifter. On a ParallelShifter each call takes the next data pin.
+    def addChain(self, shifter, registers=1):
+        lane = None
+        if hasattr(shifter, "shiftWords"):
+            lanes = self.lanes.setdefault(shifter, [])
+            if len(lanes) == len(shifter.dataPins):
+                raise ValueError(f"all {len(lanes)} data pins of the shifter are in use")
+            lane = len(lanes)
+        chain = Chain(shifter, registers, lane)
+        if lane is not None:
+            self.lanes[shifter].append(chain)
+        self.chains.append(chain)
+        return chain
+
+    # Send the current words of every chain on one shifter
+    def shiftOut(self, shifter, chain):
+        if chain.lane is None:
+            shifter.shiftWord(chain.word.value, chain.bits)
+            return
+        lanes = self.lanes[shifter]
+        bits = max(c.bits for c in lanes)
+        words = [c.word.value << (bits - c.bits) for c in lanes]
+        words += [0] * (len(shifter.dataPins) - len(words))    # unused data pins
+        shifter.shiftWords(words, bits)
+
+    def addAxis(self, chain, **options):
+        if chain.axes >= chain.bits // 4:
+            raise ValueError(f"chain is full ({chain.bits // 4} axes on {chain.bits // 8} registers)")
+        axis = Axis(chain, chain.axes, **options)
+        chain.axes += 1
+        self.axes.append(axis)
+        return axis
+
+    # Step schedule of a move: [axis, direction, periods] for each axis that moves
+    def plan(self, targets):
+        plans = []
+        for axis, tarAngle in targets.items():
+            dir, n = axis.stepsTo(tarAngle)
+            if n:
+                plans.append([axis, dir, rampPeriods(n, self.delay, self.accel,
+                                                     axis.steps_per_degree)])
+        return plans
+
+    # Time move() takes [s]: every axis runs at once, so the slowest one
+    def moveTime(self, targets):
+        return max((sum(periods) for _, _, periods in self.plan(targets)), default=0.0)
+
+    # Move the axes in targets ({axis: absolute angle}) at the same time
+    def move(self, targets):
+        plans = self.plan(targets)
+        if not plans:
+            return
+        p = multiprocessing.Process(target=self._run, args=(plans,))
+        p.start()
+        p.join()
+
+    def _run(self, plans):
+        with self.lock:
+            start = time.perf_counter()
+            due = [start] * len(plans)     # time of each axis' next step
+            done = [0] * len(plans)        # steps taken per axis
+            active = set(range(len(plans)))
+            while active:
+                now = time.perf_counter()
+                wait = min(due[i] for i in active) - now
+                if wait > 0:
+                    time.sleep(wait)
+                    now = time.perf_counter()
+
+                # Step everything that is due, then update each changed chain once
+                changed = set()
+                for i in list(active):
+                    if due[i] > now:
+                        continue
+                    axis, dir, periods = plans[i]
+                    axis.step(dir)
+                    changed.add(axis.chain)
+                    due[i] += periods[done[i]]
+                    done[i] += 1
+                    if done[i] == len(periods):
+                        active.discard(i)
+                for shifter, chain in {c.shifter: c for c in changed}.items():
+                    self.shiftOut(shifter, chain)
+
+    # Set every axis' zero point
+    def zero(self):
+        for axis in self.axes:
+            with axis.angle.get_lock():
+                axis.angle.value = 0.0
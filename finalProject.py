@@ -1,23 +1,66 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+import time
+startupT0 = time.perf_counter()     # start of the startup-time report
+
+import asyncio
+import http.client
+import io
+import traceback
 import math
+import functools
 import urllib.parse, json
 from urllib.request import urlopen
 import multiprocessing
-from shifter import Shifter
-import time
-from RPi import GPIO
+import threading
+from shifter import Shifter, ParallelShifter
+from planner import plan_route
+from commandqueue import CommandQueue, QueueFull, Superseded
+import metrics
+import ringtrace
+import profiler
+import recorder
+import journal
+import controller
+import gpiomem
+import calibrate
+import os
+import gzip
+import hashlib
+if os.environ.get("STEPPER_SIM"):
+    import simgpio as GPIO      # no Pi attached: simulated pins
+else:
+    from RPi import GPIO
+try:
+    import brotli       # optional: pip install brotli
+except ImportError:
+    brotli = None
 
 ## GPIO Setup ------------------------------------------------------------------------
-GPIO.setmode(GPIO.BCM)
-time.sleep(1)
+# Pins are only touched by initHardware(), so importing this module is cheap
 laserpin=23
-GPIO.setup(laserpin, GPIO.OUT)
-GPIO.output(laserpin, GPIO.LOW)
+shifterPins = {"data": 14, "latch": 15, "clock": 18}
+
+# Shift register on pins (default shifterPins). STEPPER_SHIFT=gpiomem writes
+# the GPIO registers through /dev/gpiomem (or the file STEPPER_GPIOMEM names)
+# instead of calling RPi.GPIO for every bit. STEPPER_SHIFT=parallel shares
+# the clock and latch with more chains on the data pins STEPPER_PARALLEL_DATA
+# lists (e.g. "16,20"); the motors are on the first chain, pins["data"].
+def makeShifter(pins=None):
+    pins = pins or shifterPins
+    mode = os.environ.get("STEPPER_SHIFT")
+    if mode == "gpiomem":
+        return gpiomem.MmapShifter(**pins,
+                                   path=os.environ.get("STEPPER_GPIOMEM", "/dev/gpiomem"))
+    if mode == "parallel":
+        extra = [int(p) for p in os.environ.get("STEPPER_PARALLEL_DATA", "").split(",") if p.strip()]
+        return ParallelShifter(data=[pins["data"]] + extra, clock=pins["clock"], latch=pins["latch"])
+    return Shifter(**pins)
 
 ## Global Variables ------------------------------------------------------------------
 Globalradius=167.64
 Globalangle=0
 Globalheight=20.955
+RING_RADIUS=300     # radius used once the robot position is set [cm]
+AXIS_LIMIT=80       # mechanical travel limit of both axes [deg]
 
 ## Helpful Websites ------------------------------------------------------------------
 # https://www.w3schools.com/css/css3_buttons.asp
@@ -25,24 +68,78 @@ Globalheight=20.955
 # old --> http://192.168.66.122:8000/positions.json
 
 
+## Metrics ---------------------------------------------------------------------------
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+STEP_OVERRUN_FACTOR = 1.5   # a step period this many times Stepper.delay counts as an overrun
+STEP_BATCH = 64             # steps per step-batch trace event
+
+httpRequests = metrics.Counter("http_requests_total", "HTTP requests by method, route and status",
+                               ("method", "route", "status"))
+httpLatency = metrics.Histogram("http_request_duration_seconds", "HTTP request handling time",
+                                LATENCY_BUCKETS, ("route",))
+targetFetchLatency = metrics.Histogram("target_fetch_duration_seconds",
+                                       "Time to fetch target data from the game server",
+                                       LATENCY_BUCKETS)
+targetFetchErrors = metrics.Counter("target_fetch_errors_total",
+                                    "Target fetches that fell back to targets.json")
+targetCacheHits = metrics.Counter("target_cache_hits_total", "Target requests served from cache")
+targetCacheMisses = metrics.Counter("target_cache_misses_total", "Target requests that needed a fetch")
+movesTotal = metrics.SharedCounter("moves_total", "Stepper moves executed")
+stepsTotal = metrics.SharedCounter("steps_total", "Motor steps issued")
+metrics.Gauge("shift_calls_total", "Words latched into the shift registers", lambda: Shifter.shifts.value,
+              kind="counter")
+stepOverruns = metrics.SharedCounter("step_overruns_total",
+                                     "Step periods longer than STEP_OVERRUN_FACTOR x Stepper.delay")
+
 ## Find JSON File --------------------------------------------------------------------
 
+# Last target data we loaded, when we loaded it, and a version that is
+# bumped every time the data differs from the previous load
+targetData = {"version": 0, "last": None, "fetched": 0.0, "fetch": None}
+TARGETS_TTL_S = 2.0     # serve cached target data for this long
+
 def load_target_data(url="http://192.168.1.254:8000/positions.json"):
     # Return parsed JSON (dict) from a URL using urllib
+    t0 = time.perf_counter()
     try:
         with urlopen(url) as response:
-            return json.load(response)
+            data = json.load(response)
+        targetFetchLatency.observe(time.perf_counter() - t0)
+        return _track_version(data)
     except Exception as e:
+        targetFetchErrors.inc()
         print("Error loading JSON from URL:", e)
         # Fallback: try loading local file
         try:
             with open("targets.json", "r") as f:
-                return json.load(f)
+                return _track_version(json.load(f))
         except Exception as e:
             print("Error loading local JSON:", e)
             return {}
         return {}
 
+def _track_version(data):
+    if data != targetData["last"]:
+        targetData["last"] = data
+        targetData["version"] += 1
+        if recording["log"] is not None:
+            recording["log"].targets(targetData["version"], data)
+    targetData["fetched"] = time.monotonic()
+    return data
+
+# Target data for request handlers: the cached copy while it is fresh,
+# otherwise one fetch in a worker thread shared by everyone who asks for it
+async def currentTargets():
+    if targetData["last"] is not None and time.monotonic() - targetData["fetched"] < TARGETS_TTL_S:
+        targetCacheHits.inc()
+        return targetData["last"]
+    targetCacheMisses.inc()
+    if targetData["fetch"] is None:
+        fetch = asyncio.get_running_loop().run_in_executor(None, load_target_data)
+        fetch.add_done_callback(lambda f: targetData.update(fetch=None))
+        targetData["fetch"] = fetch
+    return await asyncio.shield(targetData["fetch"])
+
 
 ## Get Theta and Z Values from JSON --------------------------------------------------
 def extract_theta_z(data_text):
@@ -71,523 +168,1166 @@ bedRotation = {'A':0}
 laserRotation = {'B':0}
 laserState = {"on": False}
 
-## Generate HTML Code ----------------------------------------------------------------
-def generateHTML():
-    laser_color = "green" if laserState["on"] else "red"
-    laser_text = "ON" if laserState["on"] else "OFF"
-
-    html = f"""
-    <html>
-    <head>
-        <title>Stepper Control</title>
-        <meta charset="UTF-8">
-        <style>
-            #leftPanel {{
-                width: 55%;
-            }}
-            #rightPanel {{
-                width: 40%;
-                border: 2px solid #333;
-                border-radius: 10px;
-                padding: 20px;
-                background-color: #f0f0f0;
-                height: fit-content;
-            }}
-            #orientationBox {{
-                font-size: 18px;
-                line-height: 1.6em;
-            }}
-            h3 {{
-                margin-top: 10px;
-            }}
-            .fancyButton {{
-                display: inline-block;
-                padding: 15px 25px;
-                font-size: 24px;
-                cursor: pointer;
-                text-align: center;
-                text-decoration: none;
-                color: #fff;
-                background-color: #30ba6c;
-                border: none;
-                border-radius: 15px;
-                width: 250px;
-                box-shadow: 0 9px #999;
-            }}
-            .fancyButton:active {{
-                box-shadow: 0 5px #666;
-                transform: translateY(4px);
-            }}
-        </style>
-    </head>
-    <body style="font-family: Arial; margin: 30px;">
-
-    <!-- LEFT SIDE (controls) -->
-        <h3> Stepper Axis Control </h3>
-        <p> Use the input fields below to set the desired positions for each axis. <br>
-            Click the buttons to move the axes (in degrees) or zero their positions.</p>
-
-            <div style="display: flex; flex-direction: row; gap: 40px; align-items: flex-start;">
-            <div style="flex: 1; min-width: 350px;">
-
-            <div>
-                <p>
-                    <label for="bedRotation">Bed Position [-80 and 80]:</label>
-                    <input type="number" id="bedRotation" min="-80" max="80" value="{bedRotation['A']}"><br><br>
-                </p>
-                <p>
-                    <label for="laserRotation">Laser Position [-80 and 80]:</label>
-                    <input type="number" id="laserRotation" min="-80" max="80" value="{laserRotation['B']}"><br><br>
-                </p>
-                <input type="button" value="Move" onclick="moveMotors();">
-                <input type="button" value="Zero Positions" onclick="zeroMotors();">
-            </div>
-
-            <br><hr><br>
-
-            <h3>Laser Control</h3>
-            <div id="laserIndicator"
-                style="width:40px; height:40px; border-radius:50%; background:{laser_color};
-                        display:inline-block; vertical-align:middle; margin-right:10px;"></div>
-            <span id="laserStatus" style="font-weight:bold;">Laser is {laser_text}</span>
-            <br><br>
-            <input type="button" id="laserButton" value="Toggle Laser" onclick="toggleLaser();">
-
-            <br><hr><br>
-
-            <h3>Set Robot Position</h3>
-            <select id="robotPosSelector">
-                <option value="">-- Choose turret as robot position --</option>
-            </select>
-            <br><br>
-            <input type="button" value="Set Robot Position" onclick="setRobotPosition();">
-
-            <br><hr><br>
-
-            <h3>Select Target</h3>
-                <select id="targetSelector">
-                    <option value="">-- Choose a target --</option>
-                </select>
-            <br><br>
-            <input type="button" id="moveTargetButton" value="Move to Target" onclick="moveToTarget();">
-        </div>
-
-    <!-- RIGHT SIDE (orientation display) -->
-        <div style="flex: 1; min-width: 350px;">
-            <h2>Robot Orientation</h2>
-            <div id="orientationBox">
-                <p><b>Bed Rotation:</b> <span id="bedAngleDisplay">{bedRotation['A']}</span>°</p>
-                <p><b>Laser Rotation:</b> <span id="laserAngleDisplay">{laserRotation['B']}</span>°</p>
-            </div>
-            <br><br><br><br>
-            <input type="button" value="start" onclick="startTrial();" class="fancyButton">
-        </div>
-
-    <script>
-        function updateOrientationDisplay() {{
-            document.getElementById('bedAngleDisplay').textContent =
-                document.getElementById('bedRotation').value;
-            document.getElementById('laserAngleDisplay').textContent =
-                document.getElementById('laserRotation').value;
-        }}
-
-        async function sendValue(axis, value, isZero=false) {{
-            const body = new URLSearchParams();
-            body.append(axis, value);
-            if (isZero) body.append("zero", "true");
-
-            const response = await fetch('/', {{
-                method: 'POST',
-                headers: {{ 'Content-Type': 'application/x-www-form-urlencoded' }},
-                body: body
-            }});
-            try {{
-                await response.json();
-            }} catch (e) {{
-                console.error("Non-JSON response");
-            }}
-            updateOrientationDisplay();
-        }}
-
-        function moveMotors() {{
-            let bed = parseFloat(document.getElementById('bedRotation').value);
-            let laser = parseFloat(document.getElementById('laserRotation').value);
-            if (isNaN(bed) || bed < -90 || bed > 90) return alert("Bed value must be between -90 and 90.");
-            if (isNaN(laser) || laser < -90 || laser > 90) return alert("Laser value must be between -90 and 90.");
-            sendValue("bedRotation", bed);
-            sendValue("laserRotation", laser);
-        }}
-
-        function zeroMotors() {{
-            document.getElementById('bedRotation').value = 0;
-            document.getElementById('laserRotation').value = 0;
-            sendValue("bedRotation", 0, true);
-            sendValue("laserRotation", 0, true);
-            updateOrientationDisplay();
-        }}
-
-        async function toggleLaser() {{
-            try {{
-                const response = await fetch('/toggleLaser', {{ method: 'POST' }});
-                const result = await response.json();
-
-                const indicator = document.getElementById('laserIndicator');
-                const status = document.getElementById('laserStatus');
-                if (result.on) {{
-                    indicator.style.background = 'green';
-                    status.textContent = 'Laser is ON';
-                }} else {{
-                    indicator.style.background = 'red';
-                    status.textContent = 'Laser is OFF';
-                }}
-            }} catch (err) {{
-                console.error("Error toggling laser:", err);
-                alert("Failed to toggle laser. See console for details.");
-                return;
-            }}
-        }}
-
-        /* ================= CONSTANTS ================= */
-        const R = 300;          // cm
-        const LASER_H = 20.955;
-        const MIN = -80;
-        const MAX = 80;
-
-        /* ================= ROBOT STATE ================= */
-        let robotTheta = 0;    // radians (UPDATED when robot position is set)
-
-        /* ================= HELPERS ================= */
-        function clamp(v,min,max){{ return Math.max(min,Math.min(max,v)); }}
-
-        function shortestAngleRad(theta){{
-            return (theta + Math.PI) % (2*Math.PI) - Math.PI;
-        }}
-
-        function chordDistance(dTheta){{
-            return 2 * R * Math.sin(Math.abs(dTheta) / 2);
-        }}
-
-        function laserAngle(dTheta, targetH){{
-            const D = Math.max(chordDistance(dTheta), 1e-6);
-            return Math.atan2(targetH - LASER_H, D) * 180 / Math.PI;
-        }}
-
-
-        async function moveToTarget() {{
-            const selected = document.getElementById('targetSelector').value;
-            if (!selected) {{
-                alert("Please select a target first.");
-                return;
-            }}
-
-            // Current robot orientation from UI
-            const bed = document.getElementById('bedRotation').value;
-            const laser = document.getElementById('laserRotation').value;
-
-            const body = new URLSearchParams();
-            body.append("chosenTarget", selected);
-            body.append("robotPosition", `${{bed}},${{laser}}`);
-
-            let result;
-
-            try {{
-                const response = await fetch('/moveToTarget', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/x-www-form-urlencoded' }},
-                    body
-                }});
-                result = await response.json();
-            }} catch (err) {{
-                console.error("Move request failed:", err);
-                alert("Failed to send move command.");
-                return;
-            }}
-            if (!result.success) {{
-                alert(result.message || "Move failed.");
-                return;
-            }}
-
-            // document.getElementById('bedRotation').value = bedDeg;
-            // document.getElementById('laserRotation').value = laserDeg;
-            document.getElementById('bedRotation').value = result.bed.toFixed(1);
-            document.getElementById('laserRotation').value = result.laser.toFixed(1);
-
-            // await sendValue("bedRotation", bedDeg);
-            // await sendValue("laserRotation", laserDeg);
-            updateOrientationDisplay();
-
-            // Laser ON (3 sec) then OFF
-            await fetch('/toggleLaser', {{ method: 'POST' }});
-            await new Promise(r => setTimeout(r, 3000));
-            await fetch('/toggleLaser', {{ method: 'POST' }});
-        }}
-
-
-
-        // Store robot position in JS (absolute angles)
-        let robotPosition = {{
-            bed: null,
-            laser: null
-        }};
-
-        // Code to populate drowpdown with turret/globe positions
-        async function loadTargets() {{
-            const resp = await fetch('/targets');
-            const data = await resp.json();
-
-            // ====== TARGET DROPDOWN ======
-            const selector = document.getElementById('targetSelector');
-            selector.innerHTML = "";
-            const defaultOption = document.createElement('option');
-            defaultOption.value = "";
-            defaultOption.textContent = "-- Choose a target --";
-            selector.appendChild(defaultOption);
-
-            // Turrets
-            if (data.turrets) {{
-                const groupTurrets = document.createElement('optgroup');
-                groupTurrets.label = "Turrets";
-
-                for (const [id, vals] of Object.entries(data.turrets)) {{
-                    const option = document.createElement('option');
-                    option.value = `turret_${{id}}`;
-                    option.textContent = `Turret ${{id}} → θ=${{vals.theta.toFixed(3)}} rad`;
-                    groupTurrets.appendChild(option);
-                }}
-                selector.appendChild(groupTurrets);
-            }}
-
-            // Globes
-            if (data.globes) {{
-                const groupGlobes = document.createElement('optgroup');
-                groupGlobes.label = "Globes";
-
-                data.globes.forEach((g, i) => {{
-                    const option = document.createElement('option');
-                    option.value = `globe_${{i+1}}`;
-                    option.textContent = `Globe ${{i+1}} → θ=${{g.theta.toFixed(3)}} rad, z=${{g.z.toFixed(1)}}`;
-                    groupGlobes.appendChild(option);
-                }});
-                selector.appendChild(groupGlobes);
-            }}
-
-            // Set the robot position dropdown list
-            const robSel = document.getElementById('robotPosSelector');
-            robSel.innerHTML = "";
-            const defaultRobot = document.createElement('option');
-            defaultRobot.value = "";
-            defaultRobot.textContent = "-- Choose turret as robot position --";
-            robSel.appendChild(defaultRobot);
-
-            for (const [id, vals] of Object.entries(data.turrets || {{}})) {{
-                const option = document.createElement('option');
-                option.value = `turret_${{id}}`;
-                option.textContent = `Turret ${{id}} (θ=${{vals.theta.toFixed(3)}} rad)`;
-                robSel.appendChild(option);
-            }}
-        }}
-
-
-        // Set the robot position
-        async function setRobotPosition() {{
-            const sel = document.getElementById('robotPosSelector');
-            const choice = sel.value;
-            if (!choice) return alert("Select a turret position first.");
-
-            const id = choice.split("_")[1];
-
-            // Load JSON so we know the turret positions
-            const data = await (await fetch('/targets')).json();
-            const turret = data.turrets[id];
-
-            if (!turret) return alert("Invalid turret selected.");
-
-            // Convert to degrees (absolute)
-            const bedDeg = turret.theta * 180 / Math.PI;
-            const bedRad = turret.theta;
-            const laserDeg = 0;  // Always zero when robot is at a turret
-
-            try {{
-                let response = await fetch('/setRobotPosition', {{
-                    method: "POST",
-                    headers: {{ "Content-Type": "application/x-www-form-urlencoded" }},
-                    body: `bed=${{bedRad}}&laser=${{laserDeg}}`
-                }});
-
-                const result = await response.json();
-                console.log("[SERVER RESPONSE]", result);
-            }} catch (err) {{
-                console.error("Error sending robot position:", err);
-            }}
-
-            alert(`Robot position set to Turret ${{id}}.\nBed=${{bedDeg.toFixed(1)}}°, Laser=0°`);
-        }}
-        
-        async function startTrial() {{
-            const data = await (await fetch('/targets')).json();
-
-            // Build ordered target list (strings match backend expectations)
-            let targets = [];
-
-            // Turrets first
-            for (const id of Object.keys(data.turrets || {{}})) {{
-                targets.push(`turret_${{id}}`);
-            }}
-
-            // Then globes
-            (data.globes || []).forEach((_, i) => {{
-                targets.push(`globe_${{i + 1}}`);
-            }});
-
-            if (targets.length === 0) {{
-                alert("No targets found.");
-                return;
-            }}
-
-            // Current robot orientation from UI
-            let bed = document.getElementById('bedRotation').value;
-            let laser = document.getElementById('laserRotation').value;
-
-            for (let i = 0; i < targets.length; i++) {{
-                const target = targets[i];
-                console.log(`▶ Target ${{i + 1}}/${{targets.length}}: ${{target}}`);
-
-                const body = new URLSearchParams();
-                body.append("chosenTarget", target);
-                body.append("robotPosition", `${{bed}},${{laser}}`);
-
-                let result;
-                try {{
-                    const response = await fetch('/moveToTarget', {{
-                        method: 'POST',
-                        headers: {{ 'Content-Type': 'application/x-www-form-urlencoded' }},
-                        body
-                    }});
-                    result = await response.json();
-                }} catch (err) {{
-                    console.error("Move failed:", err);
-                    alert("Autonomous trial aborted.");
-                    return;
-                }}
-
-                if (!result.success) {{
-                    alert(result.message || "Move failed.");
-                    return;
-                }}
-
-                // Update UI with ACTUAL motor angles returned by backend
-                bed = result.bed;
-                laser = result.laser;
-
-                document.getElementById('bedRotation').value = bed.toFixed(1);
-                document.getElementById('laserRotation').value = laser.toFixed(1);
-                updateOrientationDisplay();
-
-                // Laser ON (3 sec)
-                await fetch('/toggleLaser', {{ method: 'POST' }});
-                await new Promise(r => setTimeout(r, 3000));
-                await fetch('/toggleLaser', {{ method: 'POST' }});
-
-                // Small pause before next target
-                await new Promise(r => setTimeout(r, 500));
-            }}
-
-            alert("Autonomous trial complete.");
-        }}
-
-
-        loadTargets();
-        updateOrientationDisplay();
-    </script>
-
-    </body>
-    </html>
-    """
-    return html.encode("utf-8")
+## Aiming Geometry -------------------------------------------------------------------
+ANG_EPS = math.radians(2.0)     # turrets closer than this are our own position
+TURRET_Z = 0.5                  # always aim at the base of turrets
+
+# Look up a "turret_<id>" / "globe_<n>" name in the target data.
+# Returns (theta, z) or None if the target does not exist.
+def targetLocation(target_name, data):
+    if target_name.startswith("turret_"):
+        turret = data.get("turrets", {}).get(target_name.split("_")[1])
+        if turret:
+            return turret["theta"], TURRET_Z
+    elif target_name.startswith("globe_"):
+        try:
+            gid = int(target_name.split("_")[1]) - 1
+        except ValueError:
+            return None
+        globes = data.get("globes", [])
+        if 0 <= gid < len(globes):
+            return globes[gid]["theta"], globes[gid].get("z", 0)
+    return None
+
+# True if a target sits at the robot's own angular position on the ring
+def isOwnPosition(target_theta):
+    dtheta = (target_theta - Globalangle + math.pi) % (2*math.pi) - math.pi
+    return abs(dtheta) < ANG_EPS
+
+# Bed angle [deg] that points at a target on the ring
+def bedAngleFor(targetAngle):
+    alpha=.5*(math.pi-abs(targetAngle-Globalangle))
+    alpha=math.degrees(alpha)
+    if (targetAngle-Globalangle >0):
+        alpha=-alpha
+    return alpha
+
+# Laser tilt [deg] that points at a target height, or None if the target is inline
+def laserAngleFor(targetAngle, targetHeight):
+    # Signed angular difference around circle (radians)
+    dtheta = targetAngle - Globalangle
+    dtheta = (dtheta + math.pi) % (2 * math.pi) - math.pi
+
+    # Horizontal distance along ring (ARC length)
+    C = Globalradius * abs(dtheta)
+
+    # Prevent divide-by-zero
+    if C < 1e-6:
+        return None
+
+    # Vertical difference (cm)
+    # Globalheight must be the LASER HEIGHT (20.955 cm)
+    dh = targetHeight - Globalheight
+
+    # Tilt angle (negative = down), clamped to mechanical limits
+    phi_deg = math.degrees(math.atan2(dh, C))
+    return max(-AXIS_LIMIT, min(AXIS_LIMIT, phi_deg))
+
+# Angle stored mod 360 -> signed angle in (-180, 180]
+def signedAngle(angle):
+    angle %= 360
+    return angle - 360 if angle > 180 else angle
+
+## Trial Planning --------------------------------------------------------------------
+LASER_DWELL_S = 3.0     # laser on-time per target [s]
+TRIAL_PAUSE_S = 0.5     # pause before moving on to the next target [s]
+
+# All targets in trial order: turrets first, then globes
+def trialTargets(data):
+    names = [f"turret_{tid}" for tid in data.get("turrets", {})]
+    names += [f"globe_{i}" for i in range(1, len(data.get("globes", [])) + 1)]
+    return names
+
+# Time to get from one (bed, laser) pose to another. The handler moves the
+# laser axis and then the bed axis, so the two moves add up.
+def poseTravelTime(a, b):
+    return Stepper.moveTime(a[0], b[0]) + Stepper.moveTime(a[1], b[1])
+
+# Plan which targets to visit, and in what order, to get the most value
+# out of a timed round. values maps target names to points (default 1).
+def planTrial(data, budget, values=None, start=(0.0, 0.0)):
+    values = values or {}
+    targets = []
+    skipped = []
+    for name in trialTargets(data):
+        theta, z = targetLocation(name, data)
+        if name.startswith("turret_") and isOwnPosition(theta):
+            skipped.append(name)
+            continue
+        bed = max(-AXIS_LIMIT, min(AXIS_LIMIT, bedAngleFor(theta)))
+        laser = laserAngleFor(theta, z)
+        pose = (bed, start[1] if laser is None else laser)
+        targets.append({"name": name, "value": values.get(name, 1), "pose": pose})
+
+    order, value, used = plan_route(start, targets, budget, poseTravelTime,
+                                    LASER_DWELL_S + TRIAL_PAUSE_S)
+
+    # Estimated finish time of each target, so the operator can see the schedule
+    poses = {t["name"]: t["pose"] for t in targets}
+    etas = []
+    t = 0.0
+    pose = start
+    for name in order:
+        t += poseTravelTime(pose, poses[name]) + LASER_DWELL_S + TRIAL_PAUSE_S
+        pose = poses[name]
+        etas.append(round(t, 3))
+
+    return {
+        "success": True,
+        "budget": budget,
+        "order": order,
+        "value": value,
+        "time": round(used, 3),
+        "etas": etas,
+        "skipped": skipped,
+    }
+
+# Parse "turret_1:3,globe_2:5" into {"turret_1": 3.0, "globe_2": 5.0}
+# (ValueError if a value is not a finite number)
+def parseValues(text):
+    values = {}
+    for item in text.split(","):
+        if ":" in item:
+            name, value = item.split(":", 1)
+            values[name.strip()] = parseFinite(value)
+    return values
+
+# float() that also refuses NaN and the infinities (ValueError)
+def parseFinite(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"{text} is not a finite number")
+    return value
+
+# Planning budget [s] from a form field (ValueError unless finite and >= 0)
+def parseBudget(text):
+    budget = parseFinite(text)
+    if budget < 0:
+        raise ValueError("budget must not be negative")
+    return budget
+
+## Trial Runner ----------------------------------------------------------------------
+trialLock = threading.Lock()    # only one trial may run at a time
+
+MAX_PULSE_MS = 10000            # longest laser pulse the server will schedule
+laserPulseLock = threading.Lock()
+laserPulse = {"timer": None, "gen": 0}
+laserOnTime = {"total": 0.0, "since": None}    # accumulated laser on-time [s]
+
+# Switch the laser and keep laserState in sync with the pin
+def setLaser(on):
+    laserState["on"] = on
+    GPIO.output(laserpin, GPIO.HIGH if on else GPIO.LOW)
+    ringtrace.server.emit(ringtrace.INFO, ringtrace.LASER, int(on))
+
+    now = time.monotonic()
+    if on and laserOnTime["since"] is None:
+        laserOnTime["since"] = now
+    elif not on and laserOnTime["since"] is not None:
+        laserOnTime["total"] += now - laserOnTime["since"]
+        laserOnTime["since"] = None
+
+# The laser pin as it is: switched here, or by a scan's motor process
+def laserIsOn():
+    return laserState["on"] or bool(Stepper.beam.value)
+
+def laserOnSeconds():
+    since = laserOnTime["since"]
+    return laserOnTime["total"] + (time.monotonic() - since if since is not None else 0.0)
+
+metrics.Gauge("laser_on_seconds_total", "Total time the laser has been on", laserOnSeconds,
+              kind="counter")
+
+# Cancel any scheduled pulse end (manual toggles take over the laser)
+def cancelLaserPulse():
+    with laserPulseLock:
+        laserPulse["gen"] += 1
+        if laserPulse["timer"] is not None:
+            laserPulse["timer"].cancel()
+            laserPulse["timer"] = None
+
+# Turn the laser on for exactly ms milliseconds, timed on the Pi. With
+# wait=True the call returns once the laser is off again.
+def pulseLaser(ms, wait=False):
+    with laserPulseLock:
+        laserPulse["gen"] += 1
+        gen = laserPulse["gen"]
+        if laserPulse["timer"] is not None:
+            laserPulse["timer"].cancel()
+
+        # Only the newest pulse may switch the laser off
+        def end():
+            with laserPulseLock:
+                if laserPulse["gen"] == gen:
+                    setLaser(False)
+                    laserPulse["timer"] = None
+
+        setLaser(True)
+        timer = threading.Timer(ms / 1000, end)
+        timer.daemon = True
+        laserPulse["timer"] = timer
+        timer.start()
+
+    if wait:
+        timer.join()
+
+# Point both axes at a named target. Returns the JSON reply for the client:
+# the commanded angles, or success=False with a message. Turrets at our own
+# angular position are not moved to and come back with skipped=True.
+def aimAtTarget(target_name, data, motor_bed, motor_laser):
+    location = targetLocation(target_name, data)
+    if location is None:
+        if target_name.startswith("turret_"):
+            return {"success": False, "message": "Turret not found"}
+        if target_name.startswith("globe_"):
+            return {"success": False, "message": "Globe not found"}
+        return {"success": False, "message": "Unknown target"}
+
+    target_theta, target_z = location
+    if target_name.startswith("turret_") and isOwnPosition(target_theta):
+        return {"success": True, "skipped": True,
+                "bed": signedAngle(motor_bed.angle.value),
+                "laser": signedAngle(motor_laser.angle.value)}
+
+    laser_angle_deg = motor_laser.goAngleY(target_theta, target_z)
+    if laser_angle_deg is None:
+        laser_angle_deg = signedAngle(motor_laser.angle.value)
+    bed_angle_deg = motor_bed.goAngleXZ(target_theta)
+
+    ringtrace.server.emit(ringtrace.INFO, ringtrace.AIM, ringtrace.server.intern(target_name),
+                          0, bed_angle_deg, laser_angle_deg)
+
+    return {
+        "success": True,
+        "bed": max(-AXIS_LIMIT, min(AXIS_LIMIT, bed_angle_deg)),
+        "laser": max(-AXIS_LIMIT, min(AXIS_LIMIT, laser_angle_deg))
+    }
+
+# Run a whole trial on the Pi: aim, fire for LASER_DWELL_S, pause, repeat.
+# params are the parsed form fields of the request (targets=a,b,c or
+# budget=/values= to let the planner choose, dwell_ms= to override the
+# laser dwell). Every step is reported
+# through emit(dict) so the client can follow along.
+def runTrial(params, data, motor_bed, motor_laser, emit):
+    budget = params.get("budget", [""])[0]
+    if params.get("targets", [""])[0]:
+        names = params["targets"][0].split(",")
+    elif budget:
+        start = (signedAngle(motor_bed.angle.value), signedAngle(motor_laser.angle.value))
+        try:
+            plan = planTrial(data, parseBudget(budget), parseValues(params.get("values", [""])[0]), start)
+        except ValueError:
+            emit({"event": "error", "message": "budget must be a number >= 0 and values finite numbers"})
+            return
+        names = plan["order"]
+    else:
+        names = trialTargets(data)
+
+    try:
+        dwell_ms = float(params.get("dwell_ms", [LASER_DWELL_S * 1000])[0])
+    except ValueError:
+        dwell_ms = -1
+    if not 0 < dwell_ms <= MAX_PULSE_MS:
+        emit({"event": "error", "message": f"dwell_ms must be between 0 and {MAX_PULSE_MS}"})
+        return
+
+    t0 = time.perf_counter()
+    try:
+        emit({"event": "start", "targets": names})
+        for i, name in enumerate(names):
+            result = aimAtTarget(name, data, motor_bed, motor_laser)
+            if not result["success"]:
+                emit({"event": "error", "index": i, "target": name, "message": result["message"]})
+                return
+            if result.get("skipped"):
+                emit({"event": "skip", "index": i, "target": name})
+                continue
+            emit({"event": "aimed", "index": i, "target": name,
+                  "bed": result["bed"], "laser": result["laser"],
+                  "t": round(time.perf_counter() - t0, 3)})
+
+            try:
+                pulseLaser(dwell_ms, wait=True)
+            finally:
+                cancelLaserPulse()
+                setLaser(False)
+            emit({"event": "fired", "index": i, "target": name,
+                  "t": round(time.perf_counter() - t0, 3)})
+
+            if i < len(names) - 1:
+                time.sleep(TRIAL_PAUSE_S)
+
+        emit({"event": "done", "t": round(time.perf_counter() - t0, 3)})
+    except (BrokenPipeError, ConnectionResetError):
+        print("[TRIAL] Client went away, trial aborted")
+
+## Motion Programs -------------------------------------------------------------------
+MAX_PROGRAM_STEPS = 1000    # longest program accepted by /program
+MAX_WAIT_MS = 60000         # longest single wait step
+
+# Check a /program step list before anything moves. Steps are dicts with
+# absolute "bed" and/or "laser" angles [deg], a "pulse" [ms] or a "wait" [ms].
+# Returns (steps, None) or (None, error message).
+def parseProgram(steps):
+    if not isinstance(steps, list) or not steps:
+        return None, "program must be a non-empty list of steps"
+    if len(steps) > MAX_PROGRAM_STEPS:
+        return None, f"program is limited to {MAX_PROGRAM_STEPS} steps"
+
+    program = []
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or not step:
+            return None, f"step {i}: must be an object"
+        unknown = set(step) - {"bed", "laser", "pulse", "wait"}
+        if unknown:
+            return None, f"step {i}: unknown field {sorted(unknown)[0]}"
+        if ("pulse" in step or "wait" in step) and len(step) > 1:
+            return None, f"step {i}: pulse and wait must be steps of their own"
+        for key, value in step.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                return None, f"step {i}: {key} must be a number"
+        for key in ("bed", "laser"):
+            if key in step and abs(step[key]) > AXIS_LIMIT:
+                return None, f"step {i}: {key} must be between -{AXIS_LIMIT} and {AXIS_LIMIT}"
+        if "pulse" in step and not 0 < step["pulse"] <= MAX_PULSE_MS:
+            return None, f"step {i}: pulse must be between 0 and {MAX_PULSE_MS} ms"
+        if "wait" in step and not 0 <= step["wait"] <= MAX_WAIT_MS:
+            return None, f"step {i}: wait must be between 0 and {MAX_WAIT_MS} ms"
+        program.append(dict(step))
+    return program, None
+
+# Lookahead over a checked program: runs of consecutive steps that each move
+# the same single axis become one ["path", axis, [angles]] segment, which
+# goPath blends into continuous motion. Other steps stay ["step", step].
+#
+# Lookahead is within one /program body only. Queued manual moves are not
+# blended: with the two axes declared independent on the command queue, a
+# waiting move for an axis is replaced by the next one for it, so there is
+# never more than one move per axis waiting to blend with, and the axis goes
+# straight to the latest target instead of through the stale ones.
+def programSegments(program):
+    segments = []
+    for step in program:
+        if len(step) == 1 and ("bed" in step or "laser" in step):
+            axis, angle = next(iter(step.items()))
+            if segments and segments[-1][0] == "path" and segments[-1][1] == axis:
+                segments[-1][2].append(angle)
+            else:
+                segments.append(["path", axis, [angle]])
+        else:
+            segments.append(["step", step])
+    return segments
+
+# Predicted run time of a checked program from the (bed, laser) start pose [s]
+def programTime(program, start):
+    pose = {"bed": start[0], "laser": start[1]}
+    total = 0.0
+    for kind, *segment in programSegments(program):
+        if kind == "path":
+            axis, angles = segment
+            total += Stepper.pathTime(pose[axis], angles)
+            pose[axis] = Stepper.pathRuns(pose[axis], angles)[1]
+            continue
+        step = segment[0]
+        bed, laser = pose["bed"], pose["laser"]
+        if "pulse" in step:
+            total += step["pulse"] / 1000
+        elif "wait" in step:
+            total += step["wait"] / 1000
+        else:
+            target = (step.get("bed", bed), step.get("laser", laser))
+            total += poseTravelTime((bed, laser), target)
+            pose["bed"], pose["laser"] = target
+    return total
+
+# Run a checked program as one job on the command queue
+def runProgram(program, motor_bed, motor_laser):
+    start = (signedAngle(motor_bed.angle.value), signedAngle(motor_laser.angle.value))
+    predicted = programTime(program, start)
+
+    t0 = time.perf_counter()
+    try:
+        for kind, *segment in programSegments(program):
+            if kind == "path":
+                axis, angles = segment
+                if axis == "laser":
+                    motor_laser.goPath(angles)
+                    laserRotation['B'] = angles[-1]
+                else:
+                    motor_bed.goPath(angles)
+                    bedRotation['A'] = angles[-1]
+                continue
+            step = segment[0]
+            if "pulse" in step:
+                pulseLaser(step["pulse"], wait=True)
+            elif "wait" in step:
+                time.sleep(step["wait"] / 1000)
+            else:
+                if "laser" in step:
+                    motor_laser.goAngle(step["laser"])
+                    laserRotation['B'] = step["laser"]
+                if "bed" in step:
+                    motor_bed.goAngle(step["bed"])
+                    bedRotation['A'] = step["bed"]
+    finally:
+        cancelLaserPulse()
+        setLaser(False)
+
+    return {
+        "success": True,
+        "steps": len(program),
+        "predicted": round(predicted, 3),
+        "elapsed": round(time.perf_counter() - t0, 3),
+        "bed": signedAngle(motor_bed.angle.value),
+        "laser": signedAngle(motor_laser.angle.value),
+    }
+
+## Raster Scans ----------------------------------------------------------------------
+MAX_SCAN_POINTS = 20000     # largest grid accepted by /scan
+MIN_SCAN_RESOLUTION = 0.1   # finest grid spacing [deg] (one step is 0.088 deg)
+SCAN_PULSE_MS = 20          # default pulse per grid point in pulse mode
+
+# Check a /scan request: {"bed": [from, to], "laser": [from, to] (window
+# corners [deg]), "resolution": grid spacing [deg], "mode": "on" (laser on
+# along each row) or "pulse" (a pulse at each grid point), "pulse": [ms]}.
+# Returns (scan, None) or (None, error message).
+def parseScan(spec):
+    if not isinstance(spec, dict):
+        return None, "scan must be an object"
+    unknown = set(spec) - {"bed", "laser", "resolution", "mode", "pulse"}
+    if unknown:
+        return None, f"unknown field {sorted(unknown)[0]}"
+
+    scan = {"mode": spec.get("mode", "on"), "pulse": spec.get("pulse", SCAN_PULSE_MS)}
+    if scan["mode"] not in ("on", "pulse"):
+        return None, "mode must be on or pulse"
+    for key in ("bed", "laser"):
+        window = spec.get(key)
+        if (not isinstance(window, list) or len(window) != 2
+                or any(isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v)
+                       for v in window)):
+            return None, f"{key} must be [from, to] in degrees"
+        if any(abs(v) > AXIS_LIMIT for v in window):
+            return None, f"{key} must be between -{AXIS_LIMIT} and {AXIS_LIMIT}"
+        scan[key] = window
+    for key in ("resolution", "pulse"):
+        value = spec.get(key, scan.get(key))
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            return None, f"{key} must be a number"
+        scan[key] = value
+    if scan["resolution"] < MIN_SCAN_RESOLUTION:
+        return None, f"resolution must be at least {MIN_SCAN_RESOLUTION} deg"
+    if not 0 < scan["pulse"] <= MAX_PULSE_MS:
+        return None, f"pulse must be between 0 and {MAX_PULSE_MS} ms"
+
+    points = len(scanGrid(scan["bed"], scan["resolution"])) * len(scanGrid(scan["laser"], scan["resolution"]))
+    if points > MAX_SCAN_POINTS:
+        return None, f"scan is limited to {MAX_SCAN_POINTS} grid points ({points} asked for)"
+    return scan, None
+
+# Grid angles from window[0] towards window[1], resolution apart
+def scanGrid(window, resolution):
+    lo, hi = window
+    count = int(abs(hi - lo) / resolution + 1e-9) + 1
+    sign = 1 if hi >= lo else -1
+    return [lo + sign * k * resolution for k in range(count)]
+
+# Serpentine path over a checked scan from the (bed, laser) start pose, as
+# segments [axis (0 bed, 1 laser), direction, steps, beam, pulse step
+# indices]. Each row is one bed run, swept in alternate directions, with the
+# laser on through it (beam) or pulsed as it passes each grid point.
+def scanSegments(scan, start):
+    pose = list(start)
+    segments = []
+
+    def moveTo(axis, angle, beam=False, points=()):
+        delta = Stepper.moveDelta(pose[axis], angle)
+        n = int(Stepper.steps_per_degree * abs(delta))
+        pulses = sorted({min(n, int(Stepper.steps_per_degree * abs(p - pose[axis]))) for p in points})
+        pose[axis] += (1 if delta > 0 else -1) * n / Stepper.steps_per_degree
+        if n or pulses:
+            segments.append([axis, 1 if delta > 0 else -1, n, beam, pulses])
+
+    beds = scanGrid(scan["bed"], scan["resolution"])
+    pulse = scan["mode"] == "pulse"
+    moveTo(0, beds[0])
+    for row, laser in enumerate(scanGrid(scan["laser"], scan["resolution"])):
+        moveTo(1, laser)    # step over to the next row (on the first row: get to it)
+        cols = beds if row % 2 == 0 else beds[::-1]
+        moveTo(0, cols[-1], beam=not pulse, points=cols if pulse else ())
+    return segments
+
+# Predicted run time of a scan's segments [s]
+def scanTime(segments, scan):
+    if not segments:
+        return 0.0
+    total = Stepper.move_overhead / 1e6 + sum(Stepper.rampTime(n) for _, _, n, _, _ in segments)
+    if scan["mode"] == "pulse" and segments and segments[-1][4]:
+        total += scan["pulse"] / 1000   # the last pulse outlasts the last step
+    return total
+
+# Run a checked scan as one job on the command queue: the whole path goes to
+# a single motor process as continuous step segments
+def runScan(scan, motor_bed, motor_laser):
+    start = (signedAngle(motor_bed.angle.value), signedAngle(motor_laser.angle.value))
+    segments = scanSegments(scan, start)
+    predicted = scanTime(segments, scan)
+
+    cancelLaserPulse()
+    setLaser(False)     # the motor process switches the laser from off
+    laserSeconds = multiprocessing.RawValue('d', 0.0)   # on-time switched by the motor process
+    t0 = time.perf_counter()
+    try:
+        Stepper.goSegments([motor_bed, motor_laser], segments, scan["pulse"], laserSeconds)
+    finally:
+        Stepper.beam.value = 0      # in case the motor process died with the beam on
+        setLaser(False)
+        laserOnTime["total"] += laserSeconds.value
+    bedRotation['A'] = signedAngle(motor_bed.angle.value)
+    laserRotation['B'] = signedAngle(motor_laser.angle.value)
+
+    return {
+        "success": True,
+        "points": len(scanGrid(scan["bed"], scan["resolution"])) * len(scanGrid(scan["laser"], scan["resolution"])),
+        "segments": len(segments),
+        "predicted": round(predicted, 3),
+        "elapsed": round(time.perf_counter() - t0, 3),
+        "laserOn": round(laserSeconds.value, 3),
+        "bed": bedRotation['A'],
+        "laser": laserRotation['B'],
+    }
+
+## Telemetry -------------------------------------------------------------------------
+EVENTS_DEFAULT_HZ = 5       # default /events update rate
+EVENTS_MAX_HZ = 50          # fastest rate a client may ask for
+EVENTS_KEEPALIVE_S = 15     # comment line sent when nothing has changed
+
+# Everything the page needs to show where the robot really is
+def telemetrySnapshot(motor_bed, motor_laser):
+    snap = {
+        "bed": round(signedAngle(motor_bed.angle.value), 2),
+        "laser": round(signedAngle(motor_laser.angle.value), 2),
+        "laserOn": laserIsOn(),
+        "targetVersion": targetData["version"],
+        "moving": {},
+    }
+    for axis, motor in (("bed", motor_bed), ("laser", motor_laser)):
+        total = motor.move_total.value
+        if total:
+            snap["moving"][axis] = {"done": motor.move_done.value, "total": total}
+    return snap
+
+# Push telemetry to one client at rate Hz until it disconnects. Every tick
+# sends the latest snapshot only, and only if it changed, so a slow client
+# never builds up a backlog of stale updates.
+async def streamTelemetry(motor_bed, motor_laser, rate, write):
+    last = None
+    quiet = 0.0
+    while True:
+        snap = telemetrySnapshot(motor_bed, motor_laser)
+        if snap != last:
+            await write(b"event: state\ndata: " + json.dumps(snap).encode() + b"\n\n")
+            last = snap
+            quiet = 0.0
+        elif quiet >= EVENTS_KEEPALIVE_S:
+            await write(b": keepalive\n\n")
+            quiet = 0.0
+        await asyncio.sleep(1 / rate)
+        quiet += 1 / rate
+
+## Static Page ----------------------------------------------------------------------
+# The page, stylesheet and script never change while we run, so they are
+# read and compressed once at startup and served with strong ETags.
+# Live values (laser state, axis angles) come from /state instead.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_FILES = {
+    "/": ("index.html", "text/html; charset=utf-8"),
+    "/style.css": ("style.css", "text/css; charset=utf-8"),
+    "/app.js": ("app.js", "application/javascript; charset=utf-8"),
+}
+
+# url path -> {"type": content type, encoding: (body, etag)}
+def loadStaticAssets():
+    assets = {}
+    for path, (name, content_type) in STATIC_FILES.items():
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            body = f.read()
+        tag = hashlib.sha256(body).hexdigest()[:16]
+        asset = {"type": content_type,
+                 "identity": (body, f'"{tag}"'),
+                 "gzip": (gzip.compress(body, 9, mtime=0), f'"{tag}-gz"')}
+        if brotli is not None:
+            asset["br"] = (brotli.compress(body), f'"{tag}-br"')
+        assets[path] = asset
+    return assets
+
+staticAssets = loadStaticAssets()
+
+# Best encoding we have that the client accepts
+def pickEncoding(asset, accept_encoding):
+    accepted = [e.split(";")[0].strip() for e in accept_encoding.split(",")]
+    for encoding in ("br", "gzip"):
+        if encoding in asset and encoding in accepted:
+            return encoding
+    return "identity"
+
+## Configuration -------------------------------------------------------------------
+# Motion and geometry parameters can be changed while the server runs,
+# from a JSON file read at startup and through /admin/config. Changes are
+# checked as a whole and applied on the command queue, so they land between
+# moves and a move never sees half of them. The simulated backend does not
+# read or save a config file unless STEPPER_CONFIG says where it is.
+CONFIG_PATH = os.environ.get("STEPPER_CONFIG", "" if os.environ.get("STEPPER_SIM") else
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+CONFIG_RANGES = {               # allowed [min, max] of each numeric parameter
+    "delay": (100, 100000),     # Stepper.delay [us]
+    "accel": (0, 100000),       # Stepper.accel [deg/s^2], 0 = no ramp
+    "move_overhead": (0, 1000000),  # Stepper.move_overhead [us]
+    "step_overhead": (0, 100000),   # Stepper.step_overhead [us]
+    "steps_per_degree": (0.1, 100),
+    "axis_limit": (1, 180),     # AXIS_LIMIT [deg]
+    "radius": (1, 10000),       # RING_RADIUS [cm]
+    "height": (-1000, 1000),    # Globalheight [cm]
+}
+GPIO_PINS = range(2, 28)        # BCM pins on the header
+config = {"version": 0}         # bumped on every applied change
+
+def currentConfig():
+    return {
+        "version": config["version"],
+        "delay": Stepper.delay,
+        "accel": Stepper.accel,
+        "move_overhead": Stepper.move_overhead,
+        "step_overhead": Stepper.step_overhead,
+        "steps_per_degree": Stepper.steps_per_degree,
+        "axis_limit": AXIS_LIMIT,
+        "radius": RING_RADIUS,
+        "height": Globalheight,
+        "pins": dict(shifterPins),
+    }
+
+# Check a dict of changes against the current config. Returns the merged
+# config, or (None, error message) if any change is invalid.
+def checkConfig(changes):
+    if not isinstance(changes, dict):
+        return None, "config must be a JSON object"
+    merged = currentConfig()
+    for key, value in changes.items():
+        if key == "pins":
+            if not isinstance(value, dict) or set(value) - set(shifterPins):
+                return None, "pins must be an object with data, latch and/or clock"
+            pins = dict(shifterPins, **value)
+            if any(type(p) is not int or p not in GPIO_PINS for p in pins.values()):
+                return None, f"pins must be BCM pins {GPIO_PINS.start}-{GPIO_PINS.stop - 1}"
+            if len(set(pins.values())) < 3 or laserpin in pins.values():
+                return None, "data, latch, clock and laser pins must all differ"
+            merged["pins"] = pins
+        elif key in CONFIG_RANGES:
+            low, high = CONFIG_RANGES[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+                return None, f"{key} must be a number between {low} and {high}"
+            merged[key] = value
+        elif key != "version":
+            return None, f"unknown parameter {key}"
+    return merged, None
+
+# Make a checked config the live one. Runs on the command queue.
+def applyConfig(merged):
+    global AXIS_LIMIT, RING_RADIUS, Globalradius, Globalheight
+    # New pins need a new Shifter; build it first, so pins the GPIO library
+    # refuses leave the whole config unchanged. Motors pick it up on their next move.
+    s = None
+    if merged["pins"] != shifterPins and hasattr(StepperHandler, "motor_bed"):
+        s = makeShifter(merged["pins"])
+
+    Stepper.delay = merged["delay"]
+    Stepper.accel = merged["accel"]
+    Stepper.move_overhead = merged["move_overhead"]
+    Stepper.step_overhead = merged["step_overhead"]
+    Stepper.steps_per_degree = merged["steps_per_degree"]
+    Stepper.rampTime.cache_clear()      # move times depend on all of these
+    AXIS_LIMIT = merged["axis_limit"]
+    if Globalradius == RING_RADIUS:
+        Globalradius = merged["radius"]
+    RING_RADIUS = merged["radius"]
+    Globalheight = merged["height"]
+
+    shifterPins.update(merged["pins"])
+    if s is not None:
+        StepperHandler.motor_bed.s = s
+        StepperHandler.motor_laser.s = s
+
+    config["version"] += 1
+    if positions["journal"] is not None:
+        positions["journal"].commit(radius=Globalradius)
+    return dict(currentConfig(), success=True)
+
+# Parameters from CONFIG_PATH ({} if there is no file)
+def readConfigFile():
+    if not CONFIG_PATH:
+        return {}
+    try:
+        with open(CONFIG_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
 
+# Write the live config to CONFIG_PATH, replacing the old file in one step
+def saveConfigFile():
+    if not CONFIG_PATH:
+        return
+    saved = currentConfig()
+    del saved["version"]
+    tmp = CONFIG_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp, CONFIG_PATH)
+
+# Check and apply changes (None: reload the file), then save them
+def updateConfig(changes=None):
+    try:
+        if changes is None:
+            changes = readConfigFile()
+    except ValueError as e:
+        return {"success": False, "message": f"{CONFIG_PATH}: {e}"}
+    merged, error = checkConfig(changes)
+    if error:
+        return {"success": False, "message": error}
+    result = applyConfig(merged)
+    saveConfigFile()
+    return result
 
+# Calibrate the step rate on the command queue (no move can run meanwhile)
+# and optionally make the result the active, saved profile
+def runCalibration(axes, margin, apply, motor_bed, motor_laser):
+    word = Stepper.latched.value    # re-sending it leaves the coils as they are
+    result = calibrate.calibrate([motor_bed.s, motor_laser.s], [word, word], axes, margin,
+                                 Stepper.steps_per_degree, bits=8 * Stepper.registers)
+    result["success"] = True
+    if apply:
+        applied = updateConfig({key: result[key] for key in
+                                ("delay", "accel", "move_overhead", "step_overhead")})
+        result["applied"] = applied["success"]
+        if not applied["success"]:
+            result["message"] = applied["message"]
+    return result
 
 ## Run Server Command ----------------------------------------------------------------
-def runServer():
-    server_address = ("0.0.0.0", 8080)
-    httpd = ThreadingHTTPServer(server_address, StepperHandler)
-    print("Server running on http://<pi-ip>:8080/ (Press Ctrl+C to stop)")
+# All motion and laser commands go through this one ordered queue
+commands = CommandQueue(maxsize=16, independent=("bedRotation", "laserRotation"))
+metrics.Gauge("command_queue_depth", "Commands waiting to run", commands.pending)
+recording = {"log": None}   # recorder.Recorder while STEPPER_RECORD_FILE is set
+
+STARTUP_BUDGET_S = 1.0      # restart-to-ready target for the startup report
+startupTimes = {}           # phase -> seconds since startupT0
+hardware = {"ready": None}  # Future of initHardware() on the command queue
+
+# Axis positions and robot position survive restarts in this file. The
+# simulated backend does not journal unless STEPPER_JOURNAL says where to.
+JOURNAL_PATH = os.environ.get("STEPPER_JOURNAL", "" if os.environ.get("STEPPER_SIM") else
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "position.journal"))
+positions = {"journal": None}   # journal.PositionJournal once the hardware is up
+
+def startupMark(phase):
+    startupTimes[phase] = time.perf_counter() - startupT0
+
+# One line with how long each startup phase took to be reached
+def startupReport():
+    total = max(startupTimes.values())
+    phases = ", ".join(f"{phase} {t*1000:.0f} ms" for phase, t in startupTimes.items())
+    verdict = "within" if total <= STARTUP_BUDGET_S else "OVER"
+    print(f"Startup: {phases} ({verdict} the {STARTUP_BUDGET_S:g} s budget)")
+
+# GPIO mode, laser pin, shift register and both motors. Runs once, as the
+# first job on the command queue, so every motion command waits behind it.
+def initHardware():
+    global Globalangle, Globalradius
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(laserpin, GPIO.OUT)
+    GPIO.output(laserpin, GPIO.LOW)
+
+    # Tuned parameters (including the shifter pins) from the config file
+    try:
+        merged, error = checkConfig(readConfigFile())
+    except ValueError as e:
+        merged, error = None, e
+    if error:
+        print(f"Ignoring {CONFIG_PATH}:", error)
+    else:
+        applyConfig(merged)
+
+    s = makeShifter()   # set up Shifter
+
+    # Use multiprocessing.Lock() to prevent motors from trying to 
+    # execute multiple operations at the same time:
+    lock1 = multiprocessing.Lock()
+
+    # Instantiate 2 Steppers:
+    m1 = Stepper(s, lock1)
+    m2 = Stepper(s, lock1)
+
+    # Restore the last journaled pose, so a restart needs no re-zeroing
+    t0 = time.perf_counter()
+    last = None
+    if JOURNAL_PATH:
+        positions["journal"] = journal.PositionJournal(JOURNAL_PATH)
+        last = positions["journal"].load()
+    if last:
+        for motor in (m1, m2):
+            motor.restorePosition(last["steps"][motor.index], last["phases"][motor.index])
+        # Energize the coils the motors were left on, so the first step moves
+        # one half-step from where the rotors really are
+        s.shiftWord(Stepper.latched.value, 8 * Stepper.registers)
+        Globalangle, Globalradius = last["angle"], last["radius"]
+        print(f"Restored pose from journal in {(time.perf_counter() - t0)*1000:.1f} ms: "
+              f"bed {signedAngle(m1.angle.value):.2f}, laser {signedAngle(m2.angle.value):.2f}, "
+              f"robot {Globalangle:.3f} rad")
+    else:
+        # Zero the motors:
+        m1.zero()
+        m2.zero()
+        if positions["journal"] is not None:
+            positions["journal"].commit(angle=Globalangle, radius=Globalradius)
+
+    # Attach to handler so handler can move motors
+    StepperHandler.motor_laser = m2
+    StepperHandler.motor_bed = m1
+    startupMark("hardware")
+
+# Queue initHardware() (once) and return its Future
+def startHardware():
+    commands.start()
+    if hardware["ready"] is None:
+        hardware["ready"] = commands.submit(initHardware)
+    return hardware["ready"]
+
+async def serve(host="0.0.0.0", port=8080):
+    # Motors come up in the background; /targets and the page work meanwhile
+    startHardware()
+    if os.environ.get("STEPPER_TRACE_FILE"):
+        # Copy trace records to disk in the background
+        ringtrace.Flusher(os.environ["STEPPER_TRACE_FILE"],
+                          [ringtrace.motion, ringtrace.server]).start()
+    if os.environ.get("STEPPER_RECORD_FILE"):
+        # Record commands and target data for replay.py
+        recording["log"] = recorder.Recorder(os.environ["STEPPER_RECORD_FILE"])
+        if targetData["last"] is not None:
+            recording["log"].targets(targetData["version"], targetData["last"])
+    server = await asyncio.start_server(
+        lambda reader, writer: StepperHandler(reader, writer).handle(), host, port)
+    startupMark("listening")
+    print(f"Server running on http://<pi-ip>:{port}/ (Press Ctrl+C to stop)")
+    ready = asyncio.wrap_future(hardware["ready"])
+    try:
+        await ready
+        startupReport()
+    except Exception as e:
+        print("Error initializing hardware:", e)
+    async with server:
+        await server.serve_forever()
 
+def runServer():
     try:
-        httpd.serve_forever()
+        asyncio.run(serve())
     except KeyboardInterrupt:
         print("\nShutting down server...")
-        httpd.server_close()
+        ready = hardware["ready"]
+        if ready is not None and ready.done() and ready.exception() is None:
+            setLaser(False)
         print("Server stopped cleanly.")
         GPIO.cleanup()
 
 
 ## Extra Functions -------------------------------------------------------------------
+# These run on the command queue's worker thread, never on the event loop.
+
+def traceCommand(name, value):
+    ringtrace.server.emit(ringtrace.INFO, ringtrace.COMMAND, ringtrace.server.intern(name), 0, value)
+
+# Robot position on the ring, from the turret the operator picked
+def setRobotPosition(params):
+    global Globalangle, Globalradius
+    try:
+        angle = float(params.get("bed", [0])[0])
+    except ValueError:
+        angle = math.nan
+    if not math.isfinite(angle):    # would be journaled and aim every move at a limit
+        print("Invalid robot position POST")
+        return {"success": False, "message": "bed must be a number"}
+    Globalangle = angle
+    Globalradius = RING_RADIUS
+    traceCommand("robot_position", Globalangle)
+    if positions["journal"] is not None:
+        positions["journal"].commit(angle=Globalangle, radius=Globalradius)
+    return SUCCESS_JSON
+
+def toggleLaser():
+    cancelLaserPulse()
+    setLaser(not laserState["on"])
+    return {"success": True, "on": laserState["on"]}
+
+# Manual move or zero of one axis ("bedRotation" / "laserRotation")
+def axisCommand(key, value, is_zero, motor):
+    name = "BED" if key == "bedRotation" else "LASER"
+    if key == "bedRotation":
+        bedRotation['A'] = value
+    else:
+        laserRotation['B'] = value
+
+    # Save and call motor functions (only if not zeroing)
+    if not is_zero:
+        try:
+            motor.goAngle(float(value))
+            traceCommand(key, value)
+        except Exception as e:
+            print(f"Error moving {name.lower()} motor:", e)
+    else:
+        # Proper zeroing
+        try:
+            motor.zero()
+            traceCommand(f"zero_{name.lower()}", 0)
+        except Exception as e:
+            print(f"Error zeroing {name.lower()} motor:", e)
 
 
 ## HTTP Request Handler --------------------------------------------------------------
-class StepperHandler(BaseHTTPRequestHandler):
+# Replies that never change are encoded once
+SUCCESS_JSON = json.dumps({"success": True}).encode()
+TRIAL_BUSY_JSON = json.dumps({"success": False, "message": "Trial already running"}).encode()
+QUEUE_FULL_JSON = json.dumps({"success": False, "message": "Too many commands waiting, try again"}).encode()
+HARDWARE_FAILED_JSON = json.dumps({"success": False, "message": "Motor hardware failed to start"}).encode()
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+profiling = {"on": False}   # one /admin/profile at a time
+KNOWN_METHODS = {"GET", "POST"}
+KNOWN_ROUTES = set(STATIC_FILES) | {
+    "/state", "/targets", "/trial/plan", "/events", "/metrics", "/setRobotPosition",
+    "/toggleLaser", "/laser/pulse", "/selectTarget", "/moveToTarget", "/trial", "/program",
+    "/scan", "/trace", "/admin/profile", "/admin/config", "/admin/calibrate"}
+# Routes that never touch the motors or the laser, served while they start
+HARDWARE_FREE_ROUTES = set(STATIC_FILES) | {"/targets", "/metrics", "/trace"}
+MAX_PROFILE_S = 60      # longest /admin/profile run
+MAX_HEADER_LINE = 8192
+MAX_HEADERS = 100
+
+class StepperHandler:
+    """
+    One HTTP/1.1 connection, served as a coroutine on the asyncio event loop.
 
-    def do_GET(self):
-        if self.path == '/':
-            self.send_response(200)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write(generateHTML())
-        elif self.path == '/targets':
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            targets = load_target_data()
-            self.wfile.write(json.dumps(targets).encode('utf-8'))
-        else:
-            self.send_error(404)
+    Reads (page, state, telemetry, plans) are answered straight from the
+    current state snapshot. Anything that moves a motor, switches the laser
+    or changes the robot position is handed to the command queue and awaited,
+    so the loop itself never blocks and no thread is spawned per request.
+    """
 
-    def do_POST(self):
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.close_connection = False
+        self.status = 0
 
-        # Setting turret position update
-        if self.path == "/setRobotPosition":
+    # Serve requests on this connection until either side closes it
+    async def handle(self):
+        try:
+            while not self.close_connection:
+                if not await self.handle_one_request():
+                    break
+                await self.writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.writer.close()
+
+    # Answer a request that cannot be parsed and drop the connection, since
+    # where the next request would start is unknown
+    def bad_request(self):
+        self.close_connection = True
+        self.send_error(400)
+        return True
+
+    async def handle_one_request(self):
+        try:
+            line = await self.reader.readline()
+        except ValueError:      # longer than the StreamReader limit
+            return self.bad_request()
+        if not line:
+            return False
+        try:
+            self.command, self.path, version = line.decode("latin-1").split()
+        except ValueError:
+            return self.bad_request()
+
+        raw = []
+        while True:
+            try:
+                header = await self.reader.readline()
+            except ValueError:
+                return self.bad_request()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            if len(header) > MAX_HEADER_LINE or len(raw) >= MAX_HEADERS:
+                return self.bad_request()
+            raw.append(header)
+        self.headers = http.client.parse_headers(io.BytesIO(b"".join(raw) + b"\r\n"))
+
+        connection = self.headers.get("Connection", "").lower()
+        if version == "HTTP/1.0":
+            self.close_connection = connection != "keep-alive"
+        elif connection == "close":
+            self.close_connection = True
+
+        # Always drain the body, even on routes that ignore it, so the next
+        # request on this keep-alive connection starts where it should
+        try:
             length = int(self.headers.get("Content-Length", 0))
-            body = self.rfile.read(length).decode("utf-8")
-            parsed = urllib.parse.parse_qs(body)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self.bad_request()
+        try:
+            self.body = (await self.reader.readexactly(length)).decode("utf-8") if length else ""
+        except UnicodeDecodeError:
+            self.body = ""
+            return self.bad_request()
+
+        arrived = time.monotonic()
+        t0 = time.perf_counter()
+        route = urllib.parse.urlsplit(self.path).path
+        self.status = 0     # nothing sent for this request yet
+        try:
+            ready = hardware["ready"]
+            if route not in HARDWARE_FREE_ROUTES and ready is not None:
+                try:
+                    await asyncio.wrap_future(ready)
+                except Exception:
+                    self._send_json(HARDWARE_FAILED_JSON, status=503)
+                    return True
+            if self.command == "GET":
+                await self.do_GET()
+            elif self.command == "POST":
+                await self.do_POST()
+            else:
+                self.send_error(400)
+        except QueueFull:
+            self._send_json(QUEUE_FULL_JSON, status=503)
+        except ConnectionError:
+            raise
+        except Exception:
+            # A bug in a route: answer 500 (unless a reply had already
+            # started) and drop the connection instead of leaving it hanging
+            traceback.print_exc()
+            self.close_connection = True
+            if self.status == 0:
+                self.send_error(500)
+        finally:
+            if route not in KNOWN_ROUTES:
+                route = "other"     # keep label values bounded
+            method = self.command if self.command in KNOWN_METHODS else "other"
+            elapsed = time.perf_counter() - t0
+            httpLatency.observe(elapsed, route)
+            httpRequests.inc(1, method, route, str(self.status))
+            ringtrace.server.emit(ringtrace.INFO, ringtrace.REQUEST, ringtrace.server.intern(route),
+                                  self.status, elapsed)
+            if recording["log"] is not None:
+                recording["log"].request(self.command, self.path, self.body, self.status,
+                                         arrived, elapsed)
+        return True
+
+    # Run fn(*args) on the command queue and wait for its result
+    async def execute(self, fn, *args):
+        return await asyncio.wrap_future(commands.submit(fn, *args))
+
+    async def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path in staticAssets:
+            self._send_static(staticAssets[url.path])
+        elif url.path == '/state':
+            # Small dynamic part of the page
+            state = telemetrySnapshot(self.motor_bed, self.motor_laser)
+            state.update(bedInput=bedRotation['A'], laserInput=laserRotation['B'],
+                         dwellMs=LASER_DWELL_S * 1000)
+            self._send_json(state)
+        elif url.path == '/targets':
+            targets = await currentTargets()
+            self._send_bytes(json.dumps(targets).encode('utf-8'), "application/json")
+        elif url.path == '/trial/plan':
+            # Best subset/order of targets for a timed round
+            try:
+                budget = parseBudget(query.get("budget", [""])[0])
+                values = parseValues(query.get("values", [""])[0])
+            except ValueError:
+                self._send_json({"success": False, "message":
+                                 "budget must be a number >= 0 and values finite numbers"})
+                return
+            start = (signedAngle(self.motor_bed.angle.value),
+                     signedAngle(self.motor_laser.angle.value))
+            # The exact planner is exponential in the target count: keep it
+            # off the event loop so other connections and streams keep going
+            data = await currentTargets()
+            plan = await asyncio.get_running_loop().run_in_executor(
+                None, planTrial, data, budget, values, start)
+            self._send_json(plan)
+        elif url.path == '/trace':
+            # Everything still in the trace rings, oldest first
+            self._send_json({"level": ringtrace.server.level.value, "events": ringtrace.dump()})
+        elif url.path == '/metrics':
+            self._send_bytes(metrics.render(), "text/plain; version=0.0.4")
+        elif url.path == '/admin/config':
+            self._send_json(currentConfig())
+        elif url.path == '/events':
+            # Server-Sent Events telemetry stream
+            try:
+                rate = float(query.get("rate", [EVENTS_DEFAULT_HZ])[0])
+            except ValueError:
+                rate = EVENTS_DEFAULT_HZ
+            rate = max(0.1, min(EVENTS_MAX_HZ, rate))
 
-            global Globalangle, Globalradius
+            self._start_stream("text/event-stream")
+            await streamTelemetry(self.motor_bed, self.motor_laser, rate, self._write_chunk)
+        else:
+            self.send_error(404)
 
-            try:
-                Globalangle = float(parsed.get("bed", [0])[0])
-                Globalradius = 300
-                print(f"Robot position set: angle={Globalangle}, radius={Globalradius}")
-            except:
-                print("Invalid robot position POST")
+    async def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        body = self.body
 
-            self._send_json({"success": True})
+        # Setting turret position update
+        if url.path == "/setRobotPosition":
+            parsed = urllib.parse.parse_qs(body)
+            self._send_json(await self.execute(setRobotPosition, parsed))
             return
 
         # Laser toggle update
-        if self.path == "/toggleLaser":
-            # Flip the state
-            laserState["on"] = not laserState["on"]
-            print(f"Laser toggled {'ON' if laserState['on'] else 'OFF'}")
-
-            # Actually turn the laser ON or OFF
-            if laserState["on"]:
-                GPIO.output(laserpin, GPIO.HIGH)
-            else:
-                GPIO.output(laserpin, GPIO.LOW)
+        if url.path == "/toggleLaser":
+            self._send_json(await self.execute(toggleLaser))
+            return
+
+        # Timed laser pulse, switched off by the server. It takes its turn in
+        # the command queue, so it fires right after the moves queued before it.
+        if url.path == "/laser/pulse":
+            try:
+                ms = float(query.get("ms", [LASER_DWELL_S * 1000])[0])
+            except ValueError:
+                ms = -1
+            if not 0 < ms <= MAX_PULSE_MS:
+                self._send_json({"success": False, "message": f"ms must be between 0 and {MAX_PULSE_MS}"})
+                return
 
-            # Send response
-            self._send_json({"success": True, "on": laserState["on"]})
+            traceCommand("pulse", ms)
+            await self.execute(pulseLaser, ms, True)
+            self._send_json({"success": True, "on": laserState["on"], "ms": ms})
             return
 
         # Target/Globe selection update
-        if self.path == "/selectTarget":
+        if url.path == "/selectTarget":
             # read posted target name
-            length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(length).decode('utf-8')
             parsed = urllib.parse.parse_qs(body)
             target_name = parsed.get('target', [''])[0]
 
-            data = load_target_data()
+            data = await currentTargets()
             if target_name.startswith('turret_'):
                 tid = target_name.split("_")[1]
                 turret = data.get("turrets", {}).get(tid)
@@ -599,7 +1339,6 @@ class StepperHandler(BaseHTTPRequestHandler):
                 # 🚫 SKIP if turret is at robot's current angular position
                 ANG_EPS = math.radians(2.0)
                 if abs(target_theta - Globalangle) < ANG_EPS:
-                    print("[SKIP] Turret is at robot angular position")
                     self._send_json({
                         "success": False,
                         "message": "Target skipped (same angular position as robot)"
@@ -629,25 +1368,17 @@ class StepperHandler(BaseHTTPRequestHandler):
             else:
                 msg = "Unknown target."
 
-            print("Selected target:", msg)
             # reply with plain text (client reads it)
-            self.send_response(200)
-            self.send_header("Content-Type", "text/plain")
-            self.end_headers()
-            self.wfile.write(msg.encode('utf-8'))
+            self._send_bytes(msg.encode('utf-8'), "text/plain")
             return
 
-        if self.path == "/moveToTarget":
+        if url.path == "/moveToTarget":
             # Read POST data
-            length = int(self.headers.get("Content-Length", 0))
-            body = self.rfile.read(length).decode("utf-8")
             parsed = urllib.parse.parse_qs(body)
 
             target_name = parsed.get("chosenTarget", [""])[0]
             robot_pos_str = parsed.get("robotPosition", [""])[0]
 
-            print(f"[MOVE TO TARGET] robot at: {robot_pos_str}, target selected: {target_name}")
-
             # Look at robot current position
             try:
                 robot_bed_deg, robot_laser_deg = map(float, robot_pos_str.split(","))
@@ -655,81 +1386,158 @@ class StepperHandler(BaseHTTPRequestHandler):
                 robot_bed_deg = robot_laser_deg = 0  # default if not provided
 
             # Load the JSON target data
-            data = load_target_data()
+            data = await currentTargets()
+
+            # Only the newest target request waiting in the queue gets aimed at
+            try:
+                result = await asyncio.wrap_future(commands.submit(
+                    aimAtTarget, target_name, data, self.motor_bed, self.motor_laser, key="aim"))
+            except Superseded as e:
+                self._send_json({"success": False, "superseded": True, "message": str(e)})
+                return
+            if result.get("skipped"):
+                result.update(bed=robot_bed_deg, laser=robot_laser_deg)
+            self._send_json(result)
+            return
 
-            bed_angle_deg = 0
-            laser_angle_deg = 0
+        if url.path == "/trial":
+            # Run the whole trial as one queued command and stream progress
+            # back line by line as the worker reports it
+            parsed = urllib.parse.parse_qs(body)
+            data = await currentTargets()
 
-            # Determine target type and compute required angles
-            if target_name.startswith("turret_"):
-                tid = target_name.split("_")[1]
-                turret = data.get("turrets", {}).get(tid)
-                if turret:
-                    target_theta = turret["theta"]
-                    target_z = 0.5  # Always aiming at base of turrets
+            if not trialLock.acquire(blocking=False):
+                self._send_json(TRIAL_BUSY_JSON)
+                return
 
-                    ANG_EPS = math.radians(2.0)
+            loop = asyncio.get_running_loop()
+            events = asyncio.Queue()
+            client_gone = threading.Event()
 
-                    dtheta = (target_theta - Globalangle + math.pi) % (2*math.pi) - math.pi
-                    if abs(dtheta) < ANG_EPS:
-                        print("[AUTONOMOUS SKIP] Target at robot angular position")
-                        self._send_json({
-                            "success": True,
-                            "bed": robot_bed_deg,
-                            "laser": robot_laser_deg
-                        })
-                        return
+            def emit(event):
+                if client_gone.is_set():
+                    raise BrokenPipeError("trial client disconnected")
+                loop.call_soon_threadsafe(events.put_nowait, event)
 
-                    laser_angle_deg = self.motor_laser.goAngleY(target_theta, target_z)
-                    bed_angle_deg = self.motor_bed.goAngleXZ(target_theta)
+            def finished(future):
+                trialLock.release()
+                loop.call_soon_threadsafe(events.put_nowait, None)
 
-                else:
-                    self._send_json({"success": False, "message": "Turret not found"})
-                    return
+            try:
+                future = commands.submit(runTrial, parsed, data, self.motor_bed, self.motor_laser, emit)
+            except QueueFull:
+                trialLock.release()
+                raise
+            future.add_done_callback(finished)
 
-            elif target_name.startswith("globe_"):
-                gid = int(target_name.split("_")[1]) - 1
-                globes = data.get("globes", [])
-                if gid < 0 or gid >= len(globes):
-                    self._send_json({"success": False, "message": "Globe not found"})
-                    return
+            self._start_stream("application/x-ndjson")
+            try:
+                while (event := await events.get()) is not None:
+                    await self._write_chunk(json.dumps(event).encode() + b"\n")
+            except ConnectionError:
+                client_gone.set()
+                raise
+            return
 
-                globe = globes[gid]
+        if url.path == "/trace":
+            # Trace level gate: 0 = off, 1 = moves/laser/requests, 2 = also step batches
+            try:
+                level = int(query.get("level", [""])[0])
+            except ValueError:
+                level = -1
+            if level not in (ringtrace.OFF, ringtrace.INFO, ringtrace.DEBUG):
+                self._send_json({"success": False, "message": "level must be 0, 1 or 2"})
+                return
+            ringtrace.setLevel(level)
+            self._send_json({"success": True, "level": level})
+            return
 
-                # --- Use Stepper movement system formulas ---
-                # Bed angle: move in XZ plane (2D angular displacement)
-                target_theta_rad = globe["theta"]
+        if url.path == "/admin/profile":
+            # Sample this process and the motor processes for a while and
+            # return collapsed stacks (feed to flamegraph.pl or speedscope)
+            try:
+                seconds = float(query.get("seconds", [5])[0])
+                hz = float(query.get("hz", [200])[0])
+            except ValueError:
+                seconds = hz = -1
+            if not 0 < seconds <= MAX_PROFILE_S or not 0 < hz <= 1000:
+                self._send_json({"success": False,
+                                 "message": f"seconds must be in (0, {MAX_PROFILE_S}] and hz in (0, 1000]"})
+                return
+            if profiling["on"]:
+                self._send_json({"success": False, "message": "Profile already running"})
+                return
 
-                # Laser angle: move in Y plane (height difference)
-                target_z = globe.get("z", 0)
-                bed_angle_deg = self.motor_bed.goAngleXZ(target_theta_rad)
-                laser_angle_deg = self.motor_laser.goAngleY(target_theta_rad, target_z)
+            profiling["on"] = True
+            try:
+                stacks = await asyncio.get_running_loop().run_in_executor(
+                    None, profiler.profile, seconds, hz)
+            finally:
+                profiling["on"] = False
+            self._send_bytes(stacks.encode(), "text/plain; charset=utf-8")
+            return
 
-            else:
-                self._send_json({"success": False, "message": "Unknown target"})
+        if url.path == "/admin/config":
+            # Change motion/geometry parameters (JSON object), or reload the
+            # config file if the body is empty. Applied between moves.
+            try:
+                changes = json.loads(body) if body.strip() else None
+            except ValueError:
+                self._send_json({"success": False, "message": "config must be JSON"})
+                return
+            self._send_json(await self.execute(updateConfig, changes))
+            return
+
+        if url.path == "/admin/calibrate":
+            # Measure shift cost and jitter, pick the fastest safe step rate
+            # for axes= simultaneously moving axes, and make it the active
+            # profile unless apply=0
+            try:
+                axes = int(query.get("axes", [1])[0])
+                margin = float(query.get("margin", [1.5])[0])
+            except ValueError:
+                axes = margin = 0
+            if not 1 <= axes <= 16 or not 1 <= margin <= 10:
+                self._send_json({"success": False, "message": "axes must be 1-16 and margin 1-10"})
                 return
+            apply = query.get("apply", ["1"])[0] != "0"
+            self._send_json(await self.execute(runCalibration, axes, margin, apply,
+                                               self.motor_bed, self.motor_laser))
+            return
 
-            print(f"Commanding bed → {bed_angle_deg:.1f}°, laser → {laser_angle_deg:.1f}°")
+        if url.path == "/program":
+            # A whole motion sequence in one request, checked before it runs
+            try:
+                steps = json.loads(body)
+            except ValueError:
+                self._send_json({"success": False, "message": "program must be JSON"})
+                return
+            program, error = parseProgram(steps)
+            if error:
+                self._send_json({"success": False, "message": error})
+                return
+            self._send_json(await self.execute(runProgram, program, self.motor_bed, self.motor_laser))
+            return
 
-            # return JSON response with final angles
-            bed_angle_deg = max(-80, min(80, bed_angle_deg))
-            laser_angle_deg = max(-80, min(80, laser_angle_deg))
-            self._send_json({
-                "success": True,
-                "bed": bed_angle_deg,
-                "laser": laser_angle_deg
-            })
+        if url.path == "/scan":
+            # Serpentine raster over a bed/laser window, run as one continuous path
+            try:
+                spec = json.loads(body)
+            except ValueError:
+                self._send_json({"success": False, "message": "scan must be JSON"})
+                return
+            scan, error = parseScan(spec)
+            if error:
+                self._send_json({"success": False, "message": error})
+                return
+            self._send_json(await self.execute(runScan, scan, self.motor_bed, self.motor_laser))
             return
 
         # otherwise handle normal axis control as before
-        content_length = int(self.headers['Content-Length'])
-        body = self.rfile.read(content_length).decode()
         params = urllib.parse.parse_qs(body)
-
-
-        print("Received POST data:", params)
         is_zero = "zero" in params
 
+        pending = []
         for key in params:
             if key == "zero":
                 continue  # skip the flag itself
@@ -740,54 +1548,92 @@ class StepperHandler(BaseHTTPRequestHandler):
                 self._send_json({"success": False, "message": "Invalid number format"})
                 return
 
-            # Validate input range
-            if value < -180 or value > 180:
+            # Validate input range (NaN compares False with everything)
+            if not math.isfinite(value) or value < -180 or value > 180:
                 self._send_json({"success": False, "message": f"{key} must be between -180 and 180"})
                 return
 
-            # Save and call motor functions (only if not zeroing)
-            if key == "bedRotation":
-                bedRotation['A'] = value
-                if not is_zero:
-                    try:
-                        self.motor_bed.goAngle(float(value))
-                        print(f"[BED] commanded to {value}°")
-                    except Exception as e:
-                        print("Error moving bed motor:", e)
-                else:
-                    # Proper zeroing
-                    try:
-                        self.motor_bed.zero()
-                        print("Bed axis zeroed.")
-                    except Exception as e:
-                        print("Error zeroing bed motor:", e)
-
-            elif key == "laserRotation":
-                laserRotation['B'] = value
-                if not is_zero:
-                    try:
-                        self.motor_laser.goAngle(float(value))
-                        print(f"[LASER] commanded to {value}°")
-                    except Exception as e:
-                        print("Error moving laser motor:", e)
-                else:
-                    # Proper zeroing
-                    try:
-                        self.motor_laser.zero()
-                        print("Laser axis zeroed.")
-                    except Exception as e:
-                        print("Error zeroing laser motor:", e)
+            # Moves are coalesced per axis: a newer move for the same axis
+            # replaces one that has not started yet, even with a move of the
+            # other axis queued in between. Zeroing always runs.
+            if key in ("bedRotation", "laserRotation"):
+                motor = self.motor_bed if key == "bedRotation" else self.motor_laser
+                pending.append(commands.submit(axisCommand, key, value, is_zero, motor,
+                                               key=None if is_zero else key))
+
+        try:
+            for future in pending:
+                await asyncio.wrap_future(future)
+        except Superseded as e:
+            self._send_json({"success": False, "superseded": True, "message": str(e)})
+            return
+        self._send_json(SUCCESS_JSON)
+
+
+    # Status line and headers, in the style of BaseHTTPRequestHandler
+    def send_response(self, code):
+        self.status = code
+        self._headers = [f"HTTP/1.1 {code} {STATUS_TEXT.get(code, '')}\r\n"]
+
+    def send_header(self, name, value):
+        self._headers.append(f"{name}: {value}\r\n")
+
+    def end_headers(self):
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self._headers.append("\r\n")
+        self.writer.write("".join(self._headers).encode("latin-1"))
+
+    def send_error(self, code):
+        self._send_bytes(f"{code} {STATUS_TEXT.get(code, '')}\n".encode(), "text/plain", status=code)
+
+    # JSON response helper (constant replies can be passed pre-encoded as bytes)
+    def _send_json(self, obj, status=200):
+        if not isinstance(obj, bytes):
+            obj = json.dumps(obj).encode()
+        self._send_bytes(obj, "application/json", status)
+
+    # Send a complete response with Content-Length so the connection can be reused
+    def _send_bytes(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.writer.write(body)
 
-        self._send_json({"success": True})
+    # Static file with content negotiation and ETag revalidation
+    def _send_static(self, asset):
+        encoding = pickEncoding(asset, self.headers.get("Accept-Encoding", ""))
+        body, etag = asset[encoding]
+        not_modified = etag in self.headers.get("If-None-Match", "")
 
+        if not_modified:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", asset["type"])
+            self.send_header("Content-Length", str(len(body)))
+            if encoding != "identity":
+                self.send_header("Content-Encoding", encoding)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        if not not_modified:
+            self.writer.write(body)
 
-    # JSON response helper
-    def _send_json(self, obj):
-        response = json.dumps(obj).encode()
+    # Start an open-ended response. Its length is unknown, so the
+    # connection ends with it instead of being kept alive.
+    def _start_stream(self, content_type):
+        self.close_connection = True
         self.send_response(200)
-        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
         self.end_headers()
-        self.wfile.write(response)
+
+    async def _write_chunk(self, chunk):
+        self.writer.write(chunk)
+        await self.writer.drain()
 
 
 ## Stepper Class ---------------------------------------------------------------------
@@ -795,14 +1641,26 @@ class Stepper:
     # Class attributes
     num_steppers = 0      # track number of Steppers instantiated
     shifter_outputs = 0   # track shift register outputs for all motors
-    seq = [0b0001,0b0011,0b0010,0b0110,0b0100,0b1100,0b1000,0b1001] # CCW sequence
+    latched = multiprocessing.RawValue('Q', 0)  # last word shifted out, from any process
+    beam = multiprocessing.RawValue('b', 0)     # laser switched on by a scan's motor process
+    seq = controller.SEQ  # CCW half-step sequence
+    registers = 1         # 595s chained behind the shifter (4 outputs per motor, 2 motors each)
     delay = 2500          # delay between motor steps [us]
     steps_per_degree = 4096/360     # 4096 steps/rev * 1/360 rev/deg
+    accel = 0             # acceleration limit [deg/s^2], 0 = start at full speed
+    move_overhead = 0     # fixed cost of a move: its process start and join [us]
+    step_overhead = 0     # time a step takes on top of its period: shift and wake-up [us]
 
     def __init__(self, shifter, lock):
+        if 4 * (Stepper.num_steppers + 1) > 8 * Stepper.registers:
+            raise ValueError(f"{Stepper.registers} shift register(s) drive at most "
+                             f"{2 * Stepper.registers} motors")
         self.s = shifter            # shift register
         self.angle = multiprocessing.Value('d', 0.0)  # current output shaft angle
-        self.step_state = 0         # track position in sequence
+        self.move_total = multiprocessing.Value('i', 0, lock=False)  # steps in current move
+        self.move_done = multiprocessing.Value('i', 0, lock=False)   # steps taken so far
+        self.step_state = multiprocessing.RawValue('i', 0)  # position in seq, kept across move processes
+        self.index = Stepper.num_steppers   # axis number in trace records
         self.shifter_bit_start = 4*Stepper.num_steppers  # starting bit position
         self.lock = lock            # multiprocessing lock
 
@@ -815,68 +1673,262 @@ class Stepper:
 
     # Move a single +/-1 step in the motor sequence:
     def __step(self, dir):
-        self.step_state += dir    # increment/decrement the step
-        self.step_state %= 8      # ensure result stays in [0,7]
+        self.step_state.value = (self.step_state.value + dir) % 8  # stays in [0,7]
 
         # 4-bit coil pattern for this motor
         mask   = 0b1111 << self.shifter_bit_start
-        pattern = Stepper.seq[self.step_state] << self.shifter_bit_start
+        pattern = Stepper.seq[self.step_state.value] << self.shifter_bit_start
 
         # Clear existing bits only for this motor
         Stepper.shifter_outputs &= ~mask
         # Set this motor's new coil pattern
         Stepper.shifter_outputs |= pattern
 
-        self.s.shiftByte(Stepper.shifter_outputs)
+        self.s.shiftWord(Stepper.shifter_outputs, 8 * Stepper.registers)
+        Stepper.latched.value = Stepper.shifter_outputs
 
-        # update shared angle
+        # update shared angle (unwrapped: it is the real shaft position,
+        # so it can never jump across the travel limits)
         with self.angle.get_lock():
             self.angle.value += dir / Stepper.steps_per_degree
-            self.angle.value %= 360
 
     # Move relative angle from current position:
     def __rotate(self, delta):
-        self.lock.acquire()                 # wait until the lock is available
         numSteps = int(Stepper.steps_per_degree * abs(delta))    # find the right # of steps
         dir = self.__sgn(delta)        # find the direction (+/-1)
-        for s in range(numSteps):      # take the steps
-            self.__step(dir)
-            time.sleep(Stepper.delay/1e6)
+        self.__run([(dir, numSteps)], delta)
+
+    # Take runs of (direction, steps) as one move, each run ramped up from
+    # and back down to rest; delta is the net angle for the trace
+    def __run(self, runs, delta):
+        self.lock.acquire()                 # wait until the lock is available
+        sampler = profiler.childStart()     # only while /admin/profile is running
+        numSteps = sum(n for _, n in runs)
+        Stepper.shifter_outputs = Stepper.latched.value     # keep the other motor's coils as they are
+        self.move_done.value = 0       # publish progress for telemetry
+        self.move_total.value = numSteps
+        overruns = 0
+        ringtrace.motion.emit(ringtrace.INFO, ringtrace.MOVE_START, self.index, numSteps, delta)
+        s = 0
+        start = last = time.perf_counter()
+        for dir, n in runs:
+            for period in Stepper.rampPeriods(n):   # take the steps
+                self.__step(dir)
+                s += 1
+                self.move_done.value = s
+                if s % STEP_BATCH == 0:
+                    ringtrace.motion.emit(ringtrace.DEBUG, ringtrace.STEP_BATCH, self.index,
+                                          s, self.angle.value)
+                time.sleep(period)
+                now = time.perf_counter()
+                if now - last > period * STEP_OVERRUN_FACTOR:
+                    overruns += 1
+                last = now
+        self.move_total.value = 0
+        ringtrace.motion.emit(ringtrace.INFO, ringtrace.MOVE_END, self.index, numSteps,
+                              self.angle.value, last - start)
+        self.journalPosition()
+        profiler.childStop(sampler)
+
+        # counters are published once per move to keep the step loop lean
+        movesTotal.inc()
+        stepsTotal.inc(numSteps)
+        stepOverruns.inc(overruns)
         self.lock.release()
 
     # Move relative angle from current position:
     def rotate(self, delta):
+        self.checkTravel(delta)
         time.sleep(0.1)
         p = multiprocessing.Process(target=self.__rotate, args=(delta,))
         p.start()
 
-    # Move to an absolute angle taking the shortest possible path:
+    # Refuse a relative move that would end outside the travel range
+    def checkTravel(self, delta):
+        end = self.angle.value + delta
+        if abs(end) > AXIS_LIMIT and abs(end) > abs(self.angle.value):
+            raise ValueError(f"move to {end:.1f} deg is outside the +/-{AXIS_LIMIT} deg travel range")
+
+    # Move to an absolute angle, clamped to the travel range:
     def goAngle(self, tarAngle):
         # read angle safely
 
         with self.angle.get_lock():
             curAngle = self.angle.value
 
-        # shortest path math: force into [-180, 180]
-        if (tarAngle>80):
-            tarAngle=80
-        elif (tarAngle<-80):
-            tarAngle=-80
-        delta = ((tarAngle - curAngle + 540) % 360) - 180
+        delta = Stepper.moveDelta(curAngle, tarAngle)
         #delta = tarAngle - curAngle    
 
-        print(f'delta: {delta}')
         p = multiprocessing.Process(target=self.__rotate, args=(delta,))
         p.start()
         p.join()
 
+    # Move through several absolute angles in one go. Consecutive legs in
+    # the same direction are blended into one run with no stop in between;
+    # the axis only comes to rest where it reverses and at the end.
+    def goPath(self, targets):
+        with self.angle.get_lock():
+            curAngle = self.angle.value
+        runs, endAngle = Stepper.pathRuns(curAngle, targets)
+        if not runs:
+            return
+        p = multiprocessing.Process(target=self.__run, args=(runs, endAngle - curAngle))
+        p.start()
+        p.join()
+
+    # Run a raster scan's segments ([motor index, direction, steps, beam,
+    # pulse step indices]) back to back in one process, on one step clock.
+    # The laser is on through beam segments and pulsed for pulse_ms when a
+    # segment reaches a pulse index; its on-time [s] is added to laserSeconds.
+    @staticmethod
+    def goSegments(motors, segments, pulse_ms, laserSeconds):
+        if not segments:
+            return
+        p = multiprocessing.Process(target=Stepper._runSegments,
+                                    args=(motors, segments, pulse_ms, laserSeconds))
+        p.start()
+        p.join()
+
+    @staticmethod
+    def _runSegments(motors, segments, pulse_ms, laserSeconds):
+        lock = motors[0].lock               # the motors share one lock
+        lock.acquire()
+        sampler = profiler.childStart()
+        Stepper.shifter_outputs = Stepper.latched.value     # keep the idle motor's coils as they are
+        laser = {"on": False, "since": 0.0, "off_at": None}
+
+        def setBeam(on):
+            if on == laser["on"]:
+                return
+            GPIO.output(laserpin, GPIO.HIGH if on else GPIO.LOW)
+            Stepper.beam.value = int(on)
+            ringtrace.motion.emit(ringtrace.INFO, ringtrace.LASER, int(on))
+            now = time.perf_counter()
+            if on:
+                laser["since"] = now
+            else:
+                laserSeconds.value += now - laser["since"]
+            laser["on"] = on
+
+        total = overruns = 0
+        try:
+            for axis, dir, n, beam, pulses in segments:
+                motor = motors[axis]
+                fire = set(pulses)
+                motor.move_done.value = 0
+                motor.move_total.value = n
+                ringtrace.motion.emit(ringtrace.INFO, ringtrace.MOVE_START, motor.index, n,
+                                      dir * n / Stepper.steps_per_degree)
+                if beam:
+                    setBeam(True)
+                start = last = time.perf_counter()
+                periods = Stepper.rampPeriods(n)
+                for k in range(n + 1):
+                    if k in fire:
+                        setBeam(True)
+                        laser["off_at"] = time.perf_counter() + pulse_ms / 1000
+                    if k == n:
+                        break
+                    motor.__step(dir)
+                    motor.move_done.value = k + 1
+                    if (k + 1) % STEP_BATCH == 0:
+                        ringtrace.motion.emit(ringtrace.DEBUG, ringtrace.STEP_BATCH, motor.index,
+                                              k + 1, motor.angle.value)
+
+                    # End a pulse on time, even in the middle of a step period
+                    due = time.perf_counter() + periods[k]
+                    if laser["off_at"] is not None and laser["off_at"] <= due:
+                        time.sleep(max(0.0, laser["off_at"] - time.perf_counter()))
+                        setBeam(False)
+                        laser["off_at"] = None
+                    time.sleep(max(0.0, due - time.perf_counter()))
+                    now = time.perf_counter()
+                    if now - last > periods[k] * STEP_OVERRUN_FACTOR:
+                        overruns += 1
+                    last = now
+                if beam:
+                    setBeam(False)
+                motor.move_total.value = 0
+                total += n
+                ringtrace.motion.emit(ringtrace.INFO, ringtrace.MOVE_END, motor.index, n,
+                                      motor.angle.value, last - start)
+
+            if laser["off_at"] is not None:     # a pulse at the very end of the path
+                time.sleep(max(0.0, laser["off_at"] - time.perf_counter()))
+        finally:
+            setBeam(False)
+            for motor in motors:
+                motor.move_total.value = 0
+                motor.journalPosition()
+            profiler.childStop(sampler)
+
+            movesTotal.inc(len(segments))
+            stepsTotal.inc(total)
+            stepOverruns.inc(overruns)
+            lock.release()
+
+    # Runs of [direction, steps] that goPath takes from curAngle through the
+    # targets, and the angle it ends at
+    @staticmethod
+    def pathRuns(curAngle, targets):
+        runs = []
+        for tarAngle in targets:
+            delta = Stepper.moveDelta(curAngle, tarAngle)
+            n = int(Stepper.steps_per_degree * abs(delta))
+            if n == 0:
+                continue
+            dir = 1 if delta > 0 else -1
+            curAngle += dir * n / Stepper.steps_per_degree
+            if runs and runs[-1][0] == dir:
+                runs[-1][1] += n
+            else:
+                runs.append([dir, n])
+        return runs, curAngle
+
+    # Step periods [s] for a run of n steps from rest to rest. Each step is
+    # as fast as accelerating from rest up to it, and braking to rest after
+    # it, allow at Stepper.accel, but never faster than Stepper.delay.
+    @staticmethod
+    def rampPeriods(n):
+        return controller.rampPeriods(n, Stepper.delay, Stepper.accel, Stepper.steps_per_degree)
+
+    # Duration of a run of n steps [s] (cached: the planner asks a lot;
+    # applyConfig clears it when the step timing changes)
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def rampTime(n):
+        return sum(Stepper.rampPeriods(n)) + n * Stepper.step_overhead / 1e6
+
+    # Time goPath takes through the targets [s]:
+    @staticmethod
+    def pathTime(curAngle, targets):
+        runs, _ = Stepper.pathRuns(curAngle, targets)
+        if not runs:
+            return 0.0
+        return Stepper.move_overhead / 1e6 + sum(Stepper.rampTime(n) for _, n in runs)
+
+    # Relative move goAngle makes to get from one absolute angle to another [deg]:
+    @staticmethod
+    def moveDelta(curAngle, tarAngle):
+        # Angles are unwrapped and the range is one interval, so the direct
+        # path is the only one that stays inside the limits. (Going the
+        # short way around mod 360 would cross them once AXIS_LIMIT > 90.)
+        if not math.isfinite(tarAngle):     # the clamp would turn NaN into a limit
+            raise ValueError(f"target angle {tarAngle} is not a number")
+        tarAngle = max(-AXIS_LIMIT, min(AXIS_LIMIT, tarAngle))
+        return tarAngle - curAngle
+
+    # Time goAngle takes to get from one absolute angle to another [s]
+    # (it starts a move process even when there is nothing to do):
+    @staticmethod
+    def moveTime(curAngle, tarAngle):
+        delta = Stepper.moveDelta(curAngle, tarAngle)
+        return Stepper.move_overhead / 1e6 + Stepper.rampTime(int(Stepper.steps_per_degree * abs(delta)))
+
     # moves the motor in the XZ when given our angular position with respect to the center
     # and zero and a targets angular position with respect to the center 
     def goAngleXZ(self, targetAngle):
-        alpha=.5*(math.pi-abs(targetAngle-Globalangle))
-        alpha=math.degrees(alpha)
-        if (targetAngle-Globalangle >0):
-            alpha=-alpha
+        alpha = bedAngleFor(targetAngle)
         self.goAngle(alpha)
         return alpha
 
@@ -884,35 +1936,9 @@ class Stepper:
     # and zero and a targets angular position with respect to the center
     # and zero and circle radius our own height and target height     
     def goAngleY(self, targetAngle,targetHeight):
-        # Signed angular difference around circle (radians)
-        dtheta = targetAngle - Globalangle
-        dtheta = (dtheta + math.pi) % (2 * math.pi) - math.pi
-
-        # Horizontal distance along ring (ARC length)
-        C = Globalradius * abs(dtheta)
-
-        # Prevent divide-by-zero
-        if C < 1e-6:
-            print("[AngleY] Target inline — skipping tilt")
-            return
-
-        # Vertical difference (cm)
-        # Globalheight must be the LASER HEIGHT (20.955 cm)
-        dh = targetHeight - Globalheight
-
-        # Tilt angle (negative = down)
-        phi = math.atan2(dh, C)
-        phi_deg = math.degrees(phi)
-
-        # Clamp to mechanical limits
-        phi_deg = max(-80.0, min(80.0, phi_deg))
-
-        print(
-            f"[AngleY] Δθ={math.degrees(dtheta):.1f}°, "
-            f"C={C:.1f}cm, "
-            f"Δh={dh:.3f}cm, "
-            f"φ={phi_deg:.2f}°"
-        )
+        phi_deg = laserAngleFor(targetAngle, targetHeight)
+        if phi_deg is None:
+            return      # target inline, no tilt needed
 
         self.goAngle(phi_deg)
         return phi_deg
@@ -920,6 +1946,7 @@ class Stepper:
     def hoizontalZero(self):
         theta=math.atan2(Globalheight,Globalradius)
         theta=math.degrees(theta)
+        self.checkTravel(theta)
         p = multiprocessing.Process(target=self.__rotate, args=(theta,))
         p.start()
         p.join()
@@ -928,29 +1955,29 @@ class Stepper:
     def zero(self):
         with self.angle.get_lock():
             self.angle.value = 0.0
+        self.journalPosition()
 
+    # Commit the current angle, in steps from zero, and coil phase to the position journal
+    def journalPosition(self):
+        if positions["journal"] is not None:
+            positions["journal"].commit(self.index, round(self.angle.value * Stepper.steps_per_degree),
+                                        phase=self.step_state.value)
 
-## Run Code --------------------------------------------------------------------------
-if __name__ == "__main__":
-    s = Shifter(data=14,latch=15,clock=18)   # set up Shifter
-
-    # Use multiprocessing.Lock() to prevent motors from trying to 
-    # execute multiple operations at the same time:
-    lock1 = multiprocessing.Lock()
-    #lock2 = multiprocessing.Lock()
-
-    # Instantiate 2 Steppers:
-    m1 = Stepper(s, lock1)
-    m2 = Stepper(s, lock1)
+    # Take up a journaled pose: angle, and the coil phase the rotor sits at
+    def restorePosition(self, steps, phase):
+        # (signedAngle also converts journals written before angles were unwrapped)
+        self.angle.value = signedAngle(steps / Stepper.steps_per_degree)
+        self.step_state.value = phase % 8
+        mask = 0b1111 << self.shifter_bit_start
+        Stepper.latched.value = ((Stepper.latched.value & ~mask)
+                                 | Stepper.seq[self.step_state.value] << self.shifter_bit_start)
 
-    # Zero the motors:
-    m1.zero()
-    m2.zero()
 
-    # Attach to handler so handler can move motors
-    StepperHandler.motor_laser = m2
-    StepperHandler.motor_bed = m1
+## Run Code --------------------------------------------------------------------------
+startupMark("import")
 
+if __name__ == "__main__":
+    # Hardware is set up by serve() in the background (initHardware)
     try: 
         runServer()
     except Exception as e:
@@ -0,0 +1,88 @@
+# gpiomem.py
+#
+# Memory-mapped GPIO register backend for the shift register
+#
+# RPi.GPIO checks and converts its arguments on every output() call, and a
+# shiftWord() makes three of them per bit. GpioMem maps the GPIO block
+# (/dev/gpiomem, readable by the gpio group, no root needed) and MmapShifter
+# drives data, clock and latch with plain 32-bit stores to the set and clear
+# registers. The stores for a word are prepared as a list of (register,
+# value) pairs first and then written out in one tight loop.
+#
+# Any file of at least BLOCK_SIZE bytes can be mapped instead of the device,
+# which makes the backend easy to check at a desk: program() returns the
+# exact write sequence, and the file holds the last value written to each
+# register afterwards.
+#
+# Register offsets are those of the BCM2835/6/7 (Pi Zero to Pi 4), bank 0
+# (BCM pins 0-31).
+
+import mmap
+import os
+
+from shifter import Shifter
+
+BLOCK_SIZE = 4096
+GPFSEL0 = 0x00 // 4     # function select, 3 bits per pin, 10 pins per register
+GPSET0 = 0x1C // 4      # write 1 bits to drive pins high
+GPCLR0 = 0x28 // 4      # write 1 bits to drive pins low
+GPLEV0 = 0x34 // 4      # pin levels (read only)
+FSEL_OUTPUT = 0b001
+
+
+class GpioMem:
+    """The GPIO register block, as an array of 32-bit words."""
+
+    def __init__(self, path="/dev/gpiomem"):
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self.mm = mmap.mmap(fd, BLOCK_SIZE)
+        finally:
+            os.close(fd)
+        self.regs = memoryview(self.mm).cast("I")
+
+    # Make a pin an output (read-modify-write of its function select register)
+    def setOutput(self, pin):
+        if not 0 <= pin < 32:
+            raise ValueError(f"pin {pin} is not a bank 0 BCM pin")
+        reg, shift = GPFSEL0 + pin // 10, (pin % 10) * 3
+        self.regs[reg] = (self.regs[reg] & ~(0b111 << shift)) | (FSEL_OUTPUT << shift)
+
+    # Perform a prepared list of (register, value) stores in order
+    def write(self, stores):
+        regs = self.regs
+        for reg, value in stores:
+            regs[reg] = value
+
+
+class MmapShifter(Shifter):
+    """Shifter that writes the GPIO set/clear registers directly."""
+
+    def __init__(self, data, clock, latch, path="/dev/gpiomem"):
+        self.dataPin = data
+        self.latchPin = latch
+        self.clockPin = clock
+        self.gpio = GpioMem(path)
+        for pin in (data, clock, latch):
+            self.gpio.setOutput(pin)
+        self.gpio.write([(GPCLR0, (1 << data) | (1 << clock) | (1 << latch))])
+
+        # Stores for one bit (data level, clock high, clock low) and the latch
+        data, clock, latch = 1 << data, 1 << clock, 1 << latch
+        self.bit = [[(GPCLR0, data), (GPSET0, clock), (GPCLR0, clock)],
+                    [(GPSET0, data), (GPSET0, clock), (GPCLR0, clock)]]
+        self.latch = [(GPSET0, latch), (GPCLR0, latch)]
+
+    def ping(self, p):  # ping the clock or latch pin
+        self.gpio.write([(GPSET0, 1 << p), (GPCLR0, 1 << p)])
+
+    # Register stores that shift out a word (same bit order as Shifter.shiftWord)
+    def program(self, dataword, num_bits):
+        stores = self.bit[0] * (-num_bits % 8)     # Pad the word to whole registers with 0
+        for i in range(num_bits):                   # Send the word
+            stores += self.bit[(dataword >> i) & 1]
+        return stores + self.latch
+
+    def shiftWord(self, dataword, num_bits):
+        self.gpio.write(self.program(dataword, num_bits))
+        Shifter.shifts.value += 1
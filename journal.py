@@ -0,0 +1,90 @@
+# journal.py
+#
+# Persistent position journal
+#
+# Keeps the axis positions (in motor steps from zero), each motor's coil
+# phase and the robot's place on the ring in a small memory-mapped file, so a restarted server can pick
+# up the real pose instead of assuming everything is at zero. Every commit
+# rewrites one of two fixed slots, alternating, with a sequence number and a
+# CRC; a commit torn by a crash or power cut leaves the other slot intact,
+# and load() returns the newest slot that checks out. The phase says which
+# coils were energized last, so a restart can energize the same ones
+# instead of snapping the rotor to some other step.
+#
+# The mapping is shared, so the forked motor processes commit through the
+# same file as the server. Only one process should commit at a time (the
+# motor lock and the command queue already guarantee that).
+
+import math
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b"SPJ2"     # SPJ1 files (no phases) are started over
+HEADER = struct.Struct("<4sH2x")    # magic, number of axes
+
+
+class PositionJournal:
+    """Two-slot, checksummed record of axis steps and phases, robot angle and radius."""
+
+    def __init__(self, path, axes=2, sync=True):
+        self.path = path
+        self.axes = axes
+        self.sync = sync    # msync after every commit (survives power loss)
+        self.slot = struct.Struct(f"<Q{axes}q{axes}Bdd")   # seq, steps and phase per axis, angle, radius
+        size = HEADER.size + 2 * (self.slot.size + 4)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if fresh or HEADER.unpack_from(self.mm, 0) != (MAGIC, axes):
+            # New file, or one written for a different axis count: start over
+            self.mm[:] = bytes(size)
+            HEADER.pack_into(self.mm, 0, MAGIC, axes)
+
+    def _offset(self, n):
+        return HEADER.size + n * (self.slot.size + 4)
+
+    # Newest valid record as {"seq", "steps", "phases", "angle", "radius"}, or
+    # None (also when the newest one holds a non-finite angle or radius)
+    def load(self):
+        best = None
+        for n in range(2):
+            offset = self._offset(n)
+            raw = self.mm[offset:offset + self.slot.size]
+            crc, = struct.unpack_from("<I", self.mm, offset + self.slot.size)
+            if crc != zlib.crc32(raw):
+                continue
+            seq, *fields, angle, radius = self.slot.unpack(raw)
+            if seq and (best is None or seq > best["seq"]):
+                best = {"seq": seq, "steps": fields[:self.axes], "phases": fields[self.axes:],
+                        "angle": angle, "radius": radius}
+        if best is not None and not (math.isfinite(best["angle"]) and math.isfinite(best["radius"])):
+            return None
+        return best
+
+    # Write a new record; fields not given keep their last committed value
+    def commit(self, axis=None, steps=None, angle=None, radius=None, phase=None):
+        last = self.load() or {"seq": 0, "steps": [0] * self.axes, "phases": [0] * self.axes,
+                               "angle": 0.0, "radius": 0.0}
+        allSteps = list(last["steps"])
+        phases = list(last["phases"])
+        if axis is not None:
+            allSteps[axis] = steps
+            if phase is not None:
+                phases[axis] = phase
+        seq = last["seq"] + 1
+        raw = self.slot.pack(seq, *allSteps, *phases,
+                             last["angle"] if angle is None else angle,
+                             last["radius"] if radius is None else radius)
+        offset = self._offset(seq % 2)
+        self.mm[offset:offset + self.slot.size] = raw
+        struct.pack_into("<I", self.mm, offset + self.slot.size, zlib.crc32(raw))
+        if self.sync:
+            self.mm.flush()
@@ -9,8 +9,12 @@
 import time
 import multiprocessing
 from shifter import Shifter   # our custom Shifter class
+import ringtrace
 import math
 import RPi.GPIO as GPIO
+
+STEP_BATCH = 64     # steps per step-batch trace event
+
 class Stepper:
     """
     Supports operation of an arbitrary number of stepper motors using
@@ -74,7 +78,6 @@ class Stepper:
         with self.angle.get_lock():
             self.angle.value += dir / Stepper.steps_per_degree
             self.angle.value %= 360
-            print(self.angle.value)
 
     # Move relative angle from current position:
     def __rotate(self, delta):
@@ -83,6 +86,10 @@ class Stepper:
         dir = self.__sgn(delta)        # find the direction (+/-1)
         for s in range(numSteps):      # take the steps
             self.__step(dir)
+            # trace instead of printing every step (see /trace in finalProject.py)
+            if (s + 1) % STEP_BATCH == 0:
+                ringtrace.motion.emit(ringtrace.DEBUG, ringtrace.STEP_BATCH,
+                                      self.shifter_bit_start // 4, s + 1, self.angle.value)
             time.sleep(Stepper.delay/1e6)
         self.lock.release()
 
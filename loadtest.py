@@ -0,0 +1,175 @@
+# loadtest.py
+#
+# Load and soak test for the stepper server
+#
+# usage: python loadtest.py [--clients 8] [--seconds 30]
+#                           [--mix /=4,/targets=4,/moveToTarget=1,/toggleLaser=1]
+#                           [--step-us 2500] [--port 8099]
+#
+# Starts the real server (serve() with its command queue, Steppers and
+# Shifter) on the simulated GPIO backend, then runs --clients concurrent
+# clients for --seconds. Each client keeps one HTTP/1.1 connection open, as
+# a browser does, and sends requests picked at random with the --mix weights.
+# Target data comes from targets.json instead of the game server.
+#
+# The report gives throughput, p50/p95/p99 latency per route and overall,
+# and the step timing of the motors: mean step period and overrun share
+# for moves made alone before the load starts, compared with moves made
+# under load.
+
+import os
+os.environ["STEPPER_SIM"] = "1"             # must be set before finalProject imports GPIO
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import finalProject
+import ringtrace
+
+DEFAULT_MIX = "/=4,/targets=4,/moveToTarget=1,/toggleLaser=1"
+
+
+# Parse "/=4,/targets=1" into ([routes], [weights])
+def parseMix(text):
+    routes, weights = [], []
+    for item in text.split(","):
+        route, _, weight = item.partition("=")
+        routes.append(route.strip())
+        weights.append(float(weight or 1))
+    return routes, weights
+
+
+# Nearest-rank percentile of a sorted list
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+# (method, path, body) for one request to route
+def makeRequest(route, targets, rng):
+    if route == "/moveToTarget":
+        return "POST", route, f"chosenTarget={rng.choice(targets)}&robotPosition=0,0"
+    if route in ("/toggleLaser", "/setRobotPosition"):
+        return "POST", route, ""
+    return "GET", route, ""
+
+
+# Send one request on an open keep-alive connection and read the reply.
+# Returns (status, body).
+async def exchange(reader, writer, method, path, body):
+    data = body.encode()
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: loadtest\r\nAccept-Encoding: gzip\r\n"
+                  f"Content-Type: application/x-www-form-urlencoded\r\n"
+                  f"Content-Length: {len(data)}\r\n\r\n").encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split(b" ", 2)[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(port, routes, weights, targets, until, seed, results):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.monotonic() < until:
+            route = rng.choices(routes, weights)[0]
+            method, path, body = makeRequest(route, targets, rng)
+            t0 = time.perf_counter()
+            status, reply = await exchange(reader, writer, method, path, body)
+            elapsed = time.perf_counter() - t0
+            if b'"superseded": true' in reply:
+                status = "superseded"
+            results.append((route, status, elapsed))
+    finally:
+        writer.close()
+
+
+# Mean step period [us] and overrun count of the moves that ended after since
+def stepTiming(since):
+    moves = [e for e in ringtrace.motion.events() if e["event"] == "move_end" and e["t"] >= since]
+    steps = sum(e["steps"] for e in moves)
+    seconds = sum(e["seconds"] for e in moves)
+    return len(moves), steps, (seconds / steps * 1e6 if steps else 0.0)
+
+
+async def baseline(port):
+    # A few lone moves with nothing else going on
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for angle in (30, -30, 0):
+        await exchange(reader, writer, "POST", "/", f"bedRotation={angle}")
+    writer.close()
+
+
+async def run(port, clients, seconds, routes, weights, targets):
+    results = []
+    until = time.monotonic() + seconds
+    await asyncio.gather(*(client(port, routes, weights, targets, until, n, results)
+                           for n in range(clients)))
+    return results
+
+
+def report(results, seconds, clients, lone, loaded, overruns):
+    print(f"{clients} clients for {seconds:g} s: {len(results)} requests, "
+          f"{len(results) / seconds:.1f} req/s")
+    print(f"{'route':<16}{'n':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    routes = sorted({r for r, _, _ in results}) + ["all"]
+    for route in routes:
+        rows = [row for row in results if route in ("all", row[0])]
+        times = sorted(e * 1000 for _, _, e in rows)
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f"{route:<16}{len(rows):>7}{len(rows) / seconds:>9.1f}{percentile(times, 50):>9.2f}"
+              f"{percentile(times, 95):>9.2f}{percentile(times, 99):>9.2f}  "
+              + " ".join(f"{k}:{v}" for k, v in sorted(statuses.items(), key=str)))
+
+    delay = finalProject.Stepper.delay
+    for label, (moves, steps, period) in (("alone", lone), ("under load", loaded)):
+        slower = (period / delay - 1) * 100 if delay else 0.0
+        print(f"step period {label:<11} {period:8.1f} us over {moves} moves / {steps} steps "
+              f"({slower:+.1f}% vs delay {delay:g} us)")
+    print(f"step overruns under load: {overruns:g}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the stepper server on simulated GPIO")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route=weight list (default {DEFAULT_MIX})")
+    parser.add_argument("--step-us", type=float, default=None, help="override Stepper.delay [us]")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    if args.step_us is not None:
+        finalProject.Stepper.delay = args.step_us
+    with open("targets.json") as f:
+        layout = json.load(f)
+    finalProject.load_target_data = lambda url=None: finalProject._track_version(layout)
+    routes, weights = parseMix(args.mix)
+
+    threading.Thread(target=asyncio.run, args=(finalProject.serve("127.0.0.1", args.port),),
+                     daemon=True).start()
+    time.sleep(0.5)     # let the server bind
+
+    t0 = time.monotonic()
+    asyncio.run(baseline(args.port))
+    lone = stepTiming(t0)
+
+    t1 = time.monotonic()
+    overruns0 = finalProject.stepOverruns.value.value
+    results = asyncio.run(run(args.port, args.clients, args.seconds, routes, weights,
+                              finalProject.trialTargets(layout)))
+    loaded = stepTiming(t1)
+    finalProject.setLaser(False)
+
+    report(results, args.seconds, args.clients, lone, loaded,
+           finalProject.stepOverruns.value.value - overruns0)
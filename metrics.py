@@ -0,0 +1,114 @@
+# metrics.py
+#
+# Prometheus-style counters, gauges and histograms for the /metrics endpoint
+#
+# Everything here is kept per process and without locks. Updates are a
+# dict lookup and an add, so they are cheap enough for hot paths. Under the
+# GIL an increment can very occasionally be lost when two threads hit the
+# same series at once, which is fine for monitoring. Counters that the
+# forked motor processes update live in shared memory (SharedCounter), so
+# the server process can read them.
+
+import bisect
+import multiprocessing
+
+REGISTRY = []   # every metric, in the order it was created
+
+
+def _labelText(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic count, optionally split by label values."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, *labelvalues):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labelText(self.labels, key)} {value}")
+        return lines
+
+
+class SharedCounter:
+    """Counter in shared memory, for code that runs in forked motor processes."""
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = multiprocessing.RawValue('d', 0.0)
+        REGISTRY.append(self)
+
+    def inc(self, amount=1):
+        self.value.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {self.value.value:g}"]
+
+
+class Gauge:
+    """Value read from a callback at scrape time (kind="counter" if it only grows)."""
+
+    def __init__(self, name, help, fn, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        REGISTRY.append(self)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {self.fn():g}"]
+
+
+class Histogram:
+    """Bucketed observations (cumulative on output), optionally split by labels."""
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self.labels = tuple(labels)
+        self.values = {}    # label values -> [bucket counts..., +Inf count, sum]
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        series = self.values.get(labelvalues)
+        if series is None:
+            series = self.values[labelvalues] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, series in sorted(self.values.items()):
+            running = 0
+            for bound, count in zip(self.buckets + [float("inf")], series):
+                running += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labelText(names, key + (le,))} {running}")
+            lines.append(f"{self.name}_sum{_labelText(self.labels, key)} {series[-1]:g}")
+            lines.append(f"{self.name}_count{_labelText(self.labels, key)} {running}")
+        return lines
+
+
+# Text exposition format for every registered metric
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode()
@@ -0,0 +1,149 @@
+# planner.py
+#
+# Time-budgeted target selection for timed rounds.
+#
+# This is the orienteering problem: every target has a value, moving
+# between targets and firing at them costs time, and we want the subset
+# and order of targets that collects the most value inside the budget.
+# The motion-time model is passed in by the caller so this file does not
+# need to know anything about steppers or GPIO.
+
+EXACT_LIMIT = 10    # solve exactly up to this many targets, heuristic above
+
+
+def plan_route(start, targets, budget, travel_time, service_time):
+    """
+    Pick the subset and order of targets that maximizes value in budget.
+
+    start:        pose the robot is in when the round begins
+    targets:      list of dicts with "name", "value" and "pose" keys
+    budget:       available time [s]
+    travel_time:  function(poseA, poseB) -> move time [s]
+    service_time: time spent at every visited target [s] (laser dwell etc.)
+
+    Returns (order, value, time) where order is a list of target names.
+    """
+    targets = [t for t in targets if t["value"] > 0]
+    if len(targets) <= EXACT_LIMIT:
+        route = _exact(start, targets, budget, travel_time, service_time)
+    else:
+        route = _greedy(start, targets, budget, travel_time, service_time)
+        route = _improve(start, route, targets, budget, travel_time, service_time)
+
+    value = sum(targets[i]["value"] for i in route)
+    time_used = _route_time(start, route, targets, travel_time, service_time)
+    return [targets[i]["name"] for i in route], value, time_used
+
+
+# Total time of visiting targets[i] for i in route, in order:
+def _route_time(start, route, targets, travel_time, service_time):
+    total = 0.0
+    pose = start
+    for i in route:
+        total += travel_time(pose, targets[i]["pose"]) + service_time
+        pose = targets[i]["pose"]
+    return total
+
+
+# Bitmask dynamic program over (visited set, last target). Fine for the
+# handful of turrets and globes we get in a round.
+def _exact(start, targets, budget, travel_time, service_time):
+    n = len(targets)
+    if n == 0:
+        return []
+
+    # Precompute the travel matrix once (row n is the start pose)
+    poses = [t["pose"] for t in targets]
+    cost = [[travel_time(a, b) + service_time for b in poses] for a in poses]
+    cost.append([travel_time(start, b) + service_time for b in poses])
+
+    best = {}   # (mask, last) -> (time, previous last)
+    for j in range(n):
+        if cost[n][j] <= budget:
+            best[(1 << j, j)] = (cost[n][j], n)
+
+    # Masks only grow, so visiting them in numeric order is a valid schedule
+    for mask in range(1, 1 << n):
+        for last in range(n):
+            entry = best.get((mask, last))
+            if entry is None:
+                continue
+            t0 = entry[0]
+            for j in range(n):
+                if mask & (1 << j):
+                    continue
+                t1 = t0 + cost[last][j]
+                if t1 > budget:
+                    continue
+                key = (mask | (1 << j), j)
+                if key not in best or t1 < best[key][0]:
+                    best[key] = (t1, last)
+
+    # Highest value wins, ties go to the quicker route
+    goal = None
+    goal_score = (0, 0.0)
+    for (mask, last), (t, _) in best.items():
+        value = sum(targets[j]["value"] for j in range(n) if mask & (1 << j))
+        if (value, -t) > goal_score:
+            goal, goal_score = (mask, last), (value, -t)
+    if goal is None:
+        return []
+
+    # Walk the predecessor links back to the start
+    route = []
+    mask, last = goal
+    while last != n:
+        route.append(last)
+        prev = best[(mask, last)][1]
+        mask &= ~(1 << last)
+        last = prev
+    route.reverse()
+    return route
+
+
+# Cheapest-insertion by value per added second until nothing else fits:
+def _greedy(start, targets, budget, travel_time, service_time):
+    route = []
+    left = set(range(len(targets)))
+    used = 0.0
+    while left:
+        choice = None
+        for i in left:
+            for pos in range(len(route) + 1):
+                trial = route[:pos] + [i] + route[pos:]
+                t = _route_time(start, trial, targets, travel_time, service_time)
+                if t > budget:
+                    continue
+                ratio = targets[i]["value"] / max(t - used, 1e-6)
+                if choice is None or ratio > choice[0]:
+                    choice = (ratio, trial, t, i)
+        if choice is None:
+            break
+        _, route, used, i = choice
+        left.discard(i)
+    return route
+
+
+# 2-opt on the chosen order to free up time, then try to squeeze in more:
+def _improve(start, route, targets, budget, travel_time, service_time):
+    def total(r):
+        return _route_time(start, r, targets, travel_time, service_time)
+
+    improved = True
+    while improved:
+        improved = False
+        for a in range(len(route) - 1):
+            for b in range(a + 1, len(route)):
+                trial = route[:a] + route[a:b + 1][::-1] + route[b + 1:]
+                if total(trial) < total(route) - 1e-9:
+                    route = trial
+                    improved = True
+
+    for i in sorted(set(range(len(targets))) - set(route),
+                    key=lambda i: -targets[i]["value"]):
+        for pos in range(len(route) + 1):
+            trial = route[:pos] + [i] + route[pos:]
+            if total(trial) <= budget:
+                route = trial
+                break
+    return route
@@ -0,0 +1,102 @@
+# profiler.py
+#
+# On-demand sampling profiler
+#
+# A Sampler thread looks at every other thread's stack (sys._current_frames)
+# a few hundred times a second and counts each distinct stack. The result is
+# written in the "collapsed stack" format that flamegraph.pl and speedscope
+# read: one line per stack, frames separated by ';', then the sample count.
+#
+# The motor processes are forked per move, so they cannot be reached from the
+# server directly. Instead the server sets a shared deadline; every motor
+# process that starts before it runs its own Sampler and leaves its counts in
+# PROFILE_DIR for the server to merge.
+
+import os
+import sys
+import time
+import threading
+import tempfile
+import collections
+import multiprocessing
+
+PROFILE_DIR = os.path.join(tempfile.gettempdir(), f"stepper-profile-{os.getpid()}")
+deadline = multiprocessing.RawValue('d', 0.0)   # motor processes sample until this time
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of all other threads in this process every 1/hz seconds."""
+
+    def __init__(self, label, hz=200):
+        super().__init__(name="profiler", daemon=True)
+        self.label = label
+        self.interval = 1 / hz
+        self.counts = collections.Counter()
+        self.running = True
+
+    def run(self):
+        me = threading.get_ident()
+        while self.running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(f"{self.label}:{names.get(ident, ident)}")
+                self.counts[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        return self.counts
+
+
+# Profile this (server) process and any motor process started in the next
+# seconds; returns the merged collapsed stacks as text
+def profile(seconds, hz=200):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    for name in os.listdir(PROFILE_DIR):
+        os.remove(os.path.join(PROFILE_DIR, name))
+
+    sampler = Sampler("http", hz)
+    sampler.start()
+    deadline.value = time.monotonic() + seconds
+    time.sleep(seconds)
+    deadline.value = 0.0
+    counts = sampler.stop()
+
+    # Give a motor process that is still finishing its move a moment to write
+    time.sleep(0.2)
+    for name in os.listdir(PROFILE_DIR):
+        with open(os.path.join(PROFILE_DIR, name)) as f:
+            for line in f:
+                stack, _, n = line.rstrip("\n").rpartition(" ")
+                counts[stack] += int(n)
+
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+
+# Called at the start of a motor process: a running Sampler while a profile
+# is being taken, otherwise None
+def childStart(label="motion"):
+    if time.monotonic() >= deadline.value:
+        return None
+    sampler = Sampler(label)
+    sampler.start()
+    return sampler
+
+
+# Called at the end of a motor process with whatever childStart returned
+def childStop(sampler):
+    if sampler is None:
+        return
+    counts = sampler.stop()
+    path = os.path.join(PROFILE_DIR, f"motion-{os.getpid()}.txt")
+    with open(path, "w") as f:
+        for stack, n in counts.items():
+            f.write(f"{stack} {n}\n")
@@ -0,0 +1,52 @@
+# recorder.py
+#
+# Command recording for desk replays
+#
+# With STEPPER_RECORD_FILE set, the server appends one JSON line per command
+# request (method, path, body, status and how long it took) and one line
+# every time the target data changes. Times are seconds since recording
+# started, taken when the request arrived. replay.py feeds a recording back
+# through the server on the simulated GPIO backend.
+#
+# Reads (page, /state, /targets, /events, /metrics) are not recorded, and
+# neither are admin requests, which would change what a replay measures.
+
+import json
+import threading
+import time
+
+SKIP_ROUTES = ("/trace", "/admin")   # route prefixes that are never recorded
+
+
+class Recorder:
+    """Appends command and target-data records to a JSON lines file."""
+
+    def __init__(self, path):
+        self.f = open(path, "a")
+        self.t0 = time.monotonic()
+        self.lock = threading.Lock()    # target data is recorded from worker threads
+
+    def write(self, record):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.f.write(line)
+            self.f.flush()
+
+    # One handled request; arrived is its time.monotonic() arrival time
+    def request(self, method, path, body, status, arrived, elapsed):
+        if method != "POST" or path.startswith(SKIP_ROUTES):
+            return
+        self.write({"t": round(arrived - self.t0, 6), "kind": "request", "method": method,
+                    "path": path, "body": body, "status": status, "elapsed": round(elapsed, 6)})
+
+    # Target data the server is using from now on
+    def targets(self, version, data):
+        self.write({"t": round(time.monotonic() - self.t0, 6), "kind": "targets",
+                    "version": version, "data": data})
+
+
+# Records from a recording file in time order
+def load(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["t"])
@@ -0,0 +1,141 @@
+# replay.py
+#
+# Replay a command recording on the simulated GPIO backend
+#
+# usage: python replay.py recording.jsonl [--speed 10] [--step-us 2500] [--metrics]
+#
+# Record on the robot with STEPPER_RECORD_FILE=recording.jsonl, then replay
+# at a desk. Every recorded request is sent to a real StepperHandler over a
+# local socket at its recorded time divided by --speed, while the target data
+# the robot was using at that moment is served in place of the game server.
+# Moves run through Stepper and the shift register exactly as on the robot,
+# so the report compares recorded and replayed latencies route by route and
+# shows the step timing counters.
+#
+# --speed only compresses the idle time between requests. Moves and laser
+# pulses keep their real length unless --step-us shortens the step delay, so
+# commands that overlapped on the robot overlap more in a fast replay (more
+# superseded moves, possibly 503s). Use --speed 1 for a faithful replay.
+
+import os
+os.environ["STEPPER_SIM"] = "1"             # must be set before finalProject imports GPIO
+os.environ.pop("STEPPER_RECORD_FILE", None)  # never record a replay
+
+import argparse
+import asyncio
+import json
+import time
+import urllib.parse
+
+import finalProject
+import recorder
+
+
+# Nearest-rank percentile of a sorted list
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+# Send one request on its own connection and read the whole reply.
+# Returns (status, seconds).
+async def send(port, method, path, body):
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = body.encode()
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: replay\r\nConnection: close\r\n"
+                  f"Content-Type: application/x-www-form-urlencoded\r\n"
+                  f"Content-Length: {len(data)}\r\n\r\n").encode() + data)
+    await writer.drain()
+    reply = await reader.read()
+    writer.close()
+    status = int(reply.split(b" ", 2)[1]) if reply else 0
+    return status, time.perf_counter() - t0
+
+
+async def replay(records, speed):
+    # Target data as the robot saw it, switched as the timeline passes it
+    first = next((r["data"] for r in records if r["kind"] == "targets"), None)
+    if first is None:
+        with open("targets.json") as f:
+            first = json.load(f)
+    current = {"data": first}
+    finalProject.load_target_data = lambda url=None: finalProject._track_version(current["data"])
+
+    server = await asyncio.start_server(
+        lambda reader, writer: finalProject.StepperHandler(reader, writer).handle(), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    results = []    # (record, replay status, replay seconds)
+
+    async def run(record):
+        status, elapsed = await send(port, record["method"], record["path"], record["body"])
+        results.append((record, status, elapsed))
+
+    tasks = []
+    start = time.monotonic()
+    t_first = records[0]["t"] if records else 0.0
+    for record in records:
+        delay = start + (record["t"] - t_first) / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if record["kind"] == "targets":
+            current["data"] = record["data"]
+            finalProject.targetData["fetched"] = 0.0    # next request picks it up
+        else:
+            tasks.append(asyncio.create_task(run(record)))
+    await asyncio.gather(*tasks)
+    wall = time.monotonic() - start
+
+    server.close()
+    await server.wait_closed()
+    return results, wall
+
+
+def report(results, wall, speed):
+    routes = {}
+    for record, status, elapsed in results:
+        route = urllib.parse.urlsplit(record["path"]).path
+        routes.setdefault(route, []).append((record, status, elapsed))
+
+    print(f"{len(results)} requests replayed in {wall:.2f} s at speed x{speed:g}")
+    print(f"{'route':<20}{'n':>5}{'rec p50':>10}{'rec p95':>10}{'p50':>10}{'p95':>10}"
+          f"{'p99':>10}{'status!=':>10}")
+    for route, rows in sorted(routes.items()):
+        recorded = sorted(r["elapsed"] for r, _, _ in rows)
+        replayed = sorted(e for _, _, e in rows)
+        changed = sum(1 for r, status, _ in rows if status != r["status"])
+        print(f"{route:<20}{len(rows):>5}"
+              f"{percentile(recorded, 50):>10.4f}{percentile(recorded, 95):>10.4f}"
+              f"{percentile(replayed, 50):>10.4f}{percentile(replayed, 95):>10.4f}"
+              f"{percentile(replayed, 99):>10.4f}{changed:>10}")
+
+    moves = finalProject.movesTotal.value.value
+    steps = finalProject.stepsTotal.value.value
+    overruns = finalProject.stepOverruns.value.value
+    print(f"moves {moves:g}, steps {steps:g}, step overruns {overruns:g}"
+          f" ({100 * overruns / steps if steps else 0:.2f}%), laser on {finalProject.laserOnSeconds():.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a STEPPER_RECORD_FILE recording")
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=float, default=10.0,
+                        help="divide the idle time between requests by this (default 10)")
+    parser.add_argument("--step-us", type=float, default=None,
+                        help="override Stepper.delay [us]")
+    parser.add_argument("--metrics", action="store_true",
+                        help="also print the /metrics exposition after the replay")
+    args = parser.parse_args()
+
+    if args.step_us is not None:
+        finalProject.Stepper.delay = args.step_us
+
+    # Same pins and motors as on the robot, simulated
+    finalProject.startHardware().result()
+
+    results, wall = asyncio.run(replay(recorder.load(args.recording), args.speed))
+    report(results, wall, args.speed)
+    if args.metrics:
+        print(finalProject.metrics.render().decode(), end="")
@@ -0,0 +1,245 @@
+# ringtrace.py
+#
+# Ring-buffer tracing
+#
+# Events are fixed-size binary records written into a ring buffer in shared
+# memory, so the forked motor processes can record into the same buffer the
+# server reads back. Recording an event is one level check plus one
+# struct.pack_into, and nothing touches stdout. When the level is below an
+# event's level the call returns straight away. A Flusher thread can copy new
+# records to a file in the background, and load() reads that file back:
+#
+#   python ringtrace.py trace.bin       one JSON event per line
+#
+# The file is a sequence of frames, each a FRAME header (kind, ring id, name
+# id) and a payload. A RING frame (payload: text) opens each Flusher run with
+# a ring's name, a NAME frame (text) gives a string interned in that ring
+# under the header's name id, and a RECORD frame carries one RECORD. Text is
+# a "<H" byte count and UTF-8. A name is always written before the first
+# record that refers to it.
+#
+# Each ring should have one writer at a time. Motion events come from the
+# process holding the motor lock. Server events come from the server process
+# only, but from several threads (event loop, command worker, laser pulse
+# timers), so that ring serializes its writers with a lock.
+
+import json
+import struct
+import sys
+import threading
+import time
+import multiprocessing
+
+# Levels
+OFF = 0
+INFO = 1        # moves, laser edges, requests, commands
+DEBUG = 2       # step batches and other high-rate events
+
+# Event codes and the meaning of their (a, b, x, y) fields
+MOVE_START = 1
+MOVE_END = 2
+STEP_BATCH = 3
+LASER = 4
+REQUEST = 5
+AIM = 6
+COMMAND = 7
+
+FIELDS = {
+    MOVE_START: ("move_start", "axis", "steps", "delta", None),
+    MOVE_END:   ("move_end", "axis", "steps", "angle", "seconds"),
+    STEP_BATCH: ("step_batch", "axis", "done", "angle", None),
+    LASER:      ("laser", "on", None, None, None),
+    REQUEST:    ("request", "route", "status", "seconds", None),
+    AIM:        ("aim", "target", None, "bed", "laser"),
+    COMMAND:    ("command", "name", None, "value", None),
+}
+
+RECORD = struct.Struct("<dHhiff")   # time, code, a, b, x, y
+
+# Trace file frames
+FRAME = struct.Struct("<BBH")       # kind, ring id, name id
+TEXT = struct.Struct("<H")          # byte count of the UTF-8 text after it
+FRAME_RECORD = 0
+FRAME_NAME = 1
+FRAME_RING = 2
+
+NAMED = ("route", "target", "name")     # fields holding an interned string id
+
+
+# One raw record as an event dict, with interned ids looked up in names
+def decodeRecord(raw, trace, names):
+    t, code, a, b, x, y = RECORD.unpack(raw)
+    fields = FIELDS.get(code, (str(code), "a", "b", "x", "y"))
+    event = {"t": round(t, 6), "trace": trace, "event": fields[0]}
+    for key, value in zip(fields[1:], (a, b, x, y)):
+        if key is None:
+            continue
+        if key in NAMED and 0 <= value < len(names) and names[value] is not None:
+            value = names[value]
+        event[key] = round(value, 4) if isinstance(value, float) else value
+    return event
+
+
+class Trace:
+    """Fixed-size ring of binary trace records in shared memory."""
+
+    def __init__(self, name, ring, capacity=4096, level=INFO, lock=None):
+        self.name = name
+        self.ring = ring    # id of this ring in trace files
+        self.lock = lock    # for rings written from several threads
+        self.capacity = capacity
+        self.buf = multiprocessing.RawArray('B', capacity * RECORD.size)
+        self.view = memoryview(self.buf)
+        self.head = multiprocessing.RawValue('Q', 0)    # records ever written
+        self.level = multiprocessing.RawValue('i', level)
+        self.names = []     # strings referenced by id from the a field
+
+    # Record one event if level is enabled
+    def emit(self, level, code, a=0, b=0, x=0.0, y=0.0):
+        if level > self.level.value:
+            return
+        if self.lock is None:
+            self._write(code, a, b, x, y)
+        else:
+            with self.lock:
+                self._write(code, a, b, x, y)
+
+    def _write(self, code, a, b, x, y):
+        i = self.head.value
+        RECORD.pack_into(self.buf, (i % self.capacity) * RECORD.size,
+                         time.monotonic(), code, a, b, x, y)
+        self.head.value = i + 1
+
+    # Small integer id for a string (route, target name...) so it fits a record
+    def intern(self, text):
+        try:
+            return self.names.index(text)
+        except ValueError:
+            pass
+        if self.lock is None:
+            self.names.append(text)
+            return len(self.names) - 1
+        with self.lock:
+            if text not in self.names:
+                self.names.append(text)
+            return self.names.index(text)
+
+    # Raw records written since record number start, and the new head
+    def records(self, start=0):
+        head = self.head.value
+        start = max(start, head - self.capacity)
+        out = []
+        for i in range(start, head):
+            offset = (i % self.capacity) * RECORD.size
+            out.append(bytes(self.view[offset:offset + RECORD.size]))
+        return out, head
+
+    # Decoded events still in the ring, oldest first
+    def events(self):
+        return [decodeRecord(raw, self.name, self.names) for raw in self.records()[0]]
+
+
+def textFrame(kind, ring, name_id, text):
+    data = text.encode("utf-8")
+    return FRAME.pack(kind, ring, name_id) + TEXT.pack(len(data)) + data
+
+
+class Flusher(threading.Thread):
+    """Copies new records and names from some traces to a trace file every interval seconds."""
+
+    def __init__(self, path, traces, interval=1.0):
+        super().__init__(name="trace-flush", daemon=True)
+        self.path = path
+        self.traces = traces
+        self.interval = interval
+        self.done = [0] * len(traces)
+        self.named = [0] * len(traces)     # names already written, per trace
+
+    def run(self):
+        with open(self.path, "ab") as f:
+            self.startRun(f)
+            while True:
+                time.sleep(self.interval)
+                self.flush(f)
+
+    # Name every ring, so load() starts its name tables afresh
+    def startRun(self, f):
+        f.write(b"".join(textFrame(FRAME_RING, t.ring, 0, t.name) for t in self.traces))
+        f.flush()
+
+    # Write what the traces gained since the last call
+    def flush(self, f):
+        for n, trace in enumerate(self.traces):
+            raw, self.done[n] = trace.records(self.done[n])
+            names = trace.names[self.named[n]:]     # taken after the records, so it covers them
+            frames = [textFrame(FRAME_NAME, trace.ring, self.named[n] + i, text)
+                      for i, text in enumerate(names)]
+            frames += [FRAME.pack(FRAME_RECORD, trace.ring, 0) + r for r in raw]
+            self.named[n] += len(names)
+            f.write(b"".join(frames))
+        f.flush()
+
+
+# Events in a trace file written by a Flusher. Each Flusher run is merged in
+# time order; runs stay in file order (their clocks may restart).
+def load(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    rings = {}      # ring id -> (name, names)
+    runs, run = [], []
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        kind, ring, name_id = FRAME.unpack_from(data, offset)
+        offset += FRAME.size
+        if kind == FRAME_RECORD:
+            raw = data[offset:offset + RECORD.size]
+            if len(raw) < RECORD.size:
+                break       # cut off mid-write
+            offset += RECORD.size
+            name, names = rings.get(ring, (str(ring), []))
+            run.append(decodeRecord(raw, name, names))
+            continue
+
+        if offset + TEXT.size > len(data):
+            break
+        (size,) = TEXT.unpack_from(data, offset)
+        offset += TEXT.size
+        if offset + size > len(data):
+            break
+        text = data[offset:offset + size].decode("utf-8")
+        offset += size
+        if kind == FRAME_RING:
+            if run:
+                runs.append(run)
+                run = []
+            rings[ring] = (text, [])
+        elif kind == FRAME_NAME:
+            names = rings.setdefault(ring, (str(ring), []))[1]
+            names.extend([None] * (name_id + 1 - len(names)))
+            names[name_id] = text
+        else:
+            raise ValueError(f"unknown trace frame kind {kind} at byte {offset - FRAME.size}")
+    runs.append(run)
+    return [e for r in runs for e in sorted(r, key=lambda e: e["t"])]
+
+
+# Shared rings: one for the motor processes, one for the server
+motion = Trace("motion", 0)
+server = Trace("server", 1, lock=threading.Lock())
+
+
+# Everything in both rings, merged in time order
+def dump():
+    return sorted(motion.events() + server.events(), key=lambda e: e["t"])
+
+
+def setLevel(level):
+    motion.level.value = level
+    server.level.value = level
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python ringtrace.py TRACE_FILE")
+    for event in load(sys.argv[1]):
+        print(json.dumps(event))
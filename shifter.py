@@ -1,13 +1,18 @@
 # Shift register class
 
-from RPi import GPIO
+import multiprocessing
+import os
 from time import sleep
-
-GPIO.setmode(GPIO.BCM)
+if os.environ.get("STEPPER_SIM"):
+    import simgpio as GPIO      # no Pi attached: simulated pins
+else:
+    from RPi import GPIO
 
 class Shifter():
+    shifts = multiprocessing.RawValue('Q', 0)   # words latched by any shifter, in any process
 
     def __init__(self, data, clock, latch):
+        GPIO.setmode(GPIO.BCM)      # here, not at import, so importing is free
         self.dataPin = data
         self.latchPin = latch
         self.clockPin = clock
@@ -24,7 +29,7 @@ class Shifter():
     # multiple 8-bit shift registers to be chained (with overflow
     # of SR_n tied to input of SR_n+1):
     def shiftWord(self, dataword, num_bits):
-        for i in range((num_bits+1) % 8):  # Load bits short of a byte with 0
+        for i in range(-num_bits % 8):     # Pad the word to whole registers with 0
             # self.dataPin.value(0)  # MicroPython for ESP32
             GPIO.output(self.dataPin, 0) 
             self.ping(self.clockPin)
@@ -33,12 +38,46 @@ class Shifter():
             GPIO.output(self.dataPin, dataword & (1<<i))
             self.ping(self.clockPin)
         self.ping(self.latchPin)
+        Shifter.shifts.value += 1
 
     # Shift all bits in a single byte:
     def shiftByte(self, databyte):
         self.shiftWord(databyte, 8)
 
 
+# Several chains on their own data pins, sharing one clock and one latch.
+# Every clock pulse moves one bit into all of the chains at once, so K
+# chains take as many clock pulses as one.
+class ParallelShifter(Shifter):
+
+    def __init__(self, data, clock, latch):
+        self.dataPins = list(data)
+        super().__init__(self.dataPins[0], clock, latch)
+        for pin in self.dataPins[1:]:
+            GPIO.setup(pin, GPIO.OUT)
+
+    # A single word goes to the first chain; the other data pins send 0s,
+    # so no stale level is clocked into their chains
+    def shiftWord(self, dataword, num_bits):
+        self.shiftWords([dataword] + [0] * (len(self.dataPins) - 1), num_bits)
+
+    # Shift one word into each chain (datawords[k] goes to data pin k).
+    # Bit 0 is sent first, so a chain shorter than num_bits needs its word
+    # shifted left by the difference.
+    def shiftWords(self, datawords, num_bits):
+        if len(datawords) != len(self.dataPins):
+            raise ValueError(f"need one word per data pin ({len(self.dataPins)})")
+        zeros = [0] * len(self.dataPins)
+        for i in range(-num_bits % 8):     # Pad the words to whole registers with 0
+            GPIO.output(self.dataPins, zeros)
+            self.ping(self.clockPin)
+        for i in range(num_bits):          # Send bit i of every word together
+            GPIO.output(self.dataPins, [(word >> i) & 1 for word in datawords])
+            self.ping(self.clockPin)
+        self.ping(self.latchPin)
+        Shifter.shifts.value += 1
+
+
 # Example:
 #
 # from time import sleep
@@ -46,3 +85,6 @@ class Shifter():
 # for i in range(256):
 #     s.shiftByte(i)
 #     sleep(0.1)
+#
+# p = ParallelShifter(data=[16,19,26],clock=20,latch=21)   # 3 chains, 1 clock
+# p.shiftWords([0x0f, 0xf0, 0xaa], 8)
@@ -0,0 +1,57 @@
+# simgpio.py
+#
+# Simulated GPIO backend
+#
+# Stands in for RPi.GPIO when there is no Pi: the same calls, but pin levels
+# are only remembered, never driven. finalProject and shifter import it
+# instead of RPi.GPIO when the STEPPER_SIM environment variable is set, so
+# the whole server (handler, command queue, steppers, shift register) runs
+# unchanged at a desk. The motor processes still sleep Stepper.delay per
+# step, so moves take as long as they would on the robot unless the delay
+# is changed.
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+
+mode = None
+pins = {}       # pin -> last level written (per process)
+writes = 0      # output() calls in this process
+
+
+def setmode(m):
+    global mode
+    mode = m
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(pin, direction, initial=LOW):
+    pins[pin] = initial if direction == OUT else LOW
+
+
+# Like RPi.GPIO, pin may be a list of pins, with one value or a list of values
+def output(pin, value):
+    global writes
+    channels = pin if isinstance(pin, (list, tuple)) else [pin]
+    values = value if isinstance(value, (list, tuple)) else [value] * len(channels)
+    if len(values) != len(channels):
+        raise RuntimeError("need one value per channel")
+    for channel, level in zip(channels, values):
+        if channel not in pins:
+            raise RuntimeError(f"pin {channel} was not set up as an output")
+        pins[channel] = HIGH if level else LOW
+    writes += 1
+
+
+def input(pin):
+    return pins.get(pin, LOW)
+
+
+def cleanup():
+    pins.clear()
@@ -0,0 +1,346 @@
+// True while the /events stream is feeding us real motor positions
+let liveTelemetry = false;
+
+// Laser dwell per target [ms], replaced by the server's value in loadState()
+let dwellMs = 3000;
+
+function updateOrientationDisplay() {
+    if (liveTelemetry) return;
+    document.getElementById('bedAngleDisplay').textContent =
+        document.getElementById('bedRotation').value;
+    document.getElementById('laserAngleDisplay').textContent =
+        document.getElementById('laserRotation').value;
+}
+
+function showLaser(on) {
+    document.getElementById('laserIndicator').style.background = on ? 'green' : 'red';
+    document.getElementById('laserStatus').textContent = on ? 'Laser is ON' : 'Laser is OFF';
+}
+
+// Live telemetry: actual positions, move progress, laser and target data version
+function startTelemetry() {
+    if (!window.EventSource) return;
+    let targetVersion = null;
+    const events = new EventSource('/events');
+    events.addEventListener('state', (e) => {
+        const st = JSON.parse(e.data);
+        liveTelemetry = true;
+
+        let bedText = st.bed.toFixed(1);
+        let laserText = st.laser.toFixed(1);
+        if (st.moving.bed) bedText += ` (moving ${Math.round(100 * st.moving.bed.done / st.moving.bed.total)}%)`;
+        if (st.moving.laser) laserText += ` (moving ${Math.round(100 * st.moving.laser.done / st.moving.laser.total)}%)`;
+        document.getElementById('bedAngleDisplay').textContent = bedText;
+        document.getElementById('laserAngleDisplay').textContent = laserText;
+        showLaser(st.laserOn);
+
+        if (targetVersion !== null && st.targetVersion !== targetVersion) loadTargets();
+        targetVersion = st.targetVersion;
+    });
+    events.onerror = () => { liveTelemetry = false; };
+}
+
+async function sendValue(axis, value, isZero=false) {
+    const body = new URLSearchParams();
+    body.append(axis, value);
+    if (isZero) body.append("zero", "true");
+
+    const response = await fetch('/', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+        body: body
+    });
+    try {
+        await response.json();
+    } catch (e) {
+        console.error("Non-JSON response");
+    }
+    updateOrientationDisplay();
+}
+
+function moveMotors() {
+    let bed = parseFloat(document.getElementById('bedRotation').value);
+    let laser = parseFloat(document.getElementById('laserRotation').value);
+    if (isNaN(bed) || bed < -90 || bed > 90) return alert("Bed value must be between -90 and 90.");
+    if (isNaN(laser) || laser < -90 || laser > 90) return alert("Laser value must be between -90 and 90.");
+    sendValue("bedRotation", bed);
+    sendValue("laserRotation", laser);
+}
+
+function zeroMotors() {
+    document.getElementById('bedRotation').value = 0;
+    document.getElementById('laserRotation').value = 0;
+    sendValue("bedRotation", 0, true);
+    sendValue("laserRotation", 0, true);
+    updateOrientationDisplay();
+}
+
+async function toggleLaser() {
+    try {
+        const response = await fetch('/toggleLaser', { method: 'POST' });
+        const result = await response.json();
+
+        showLaser(result.on);
+    } catch (err) {
+        console.error("Error toggling laser:", err);
+        alert("Failed to toggle laser. See console for details.");
+        return;
+    }
+}
+
+/* ================= CONSTANTS ================= */
+const R = 300;          // cm
+const LASER_H = 20.955;
+const MIN = -80;
+const MAX = 80;
+
+/* ================= ROBOT STATE ================= */
+let robotTheta = 0;    // radians (UPDATED when robot position is set)
+
+/* ================= HELPERS ================= */
+function clamp(v,min,max){ return Math.max(min,Math.min(max,v)); }
+
+function shortestAngleRad(theta){
+    return (theta + Math.PI) % (2*Math.PI) - Math.PI;
+}
+
+function chordDistance(dTheta){
+    return 2 * R * Math.sin(Math.abs(dTheta) / 2);
+}
+
+function laserAngle(dTheta, targetH){
+    const D = Math.max(chordDistance(dTheta), 1e-6);
+    return Math.atan2(targetH - LASER_H, D) * 180 / Math.PI;
+}
+
+
+async function moveToTarget() {
+    const selected = document.getElementById('targetSelector').value;
+    if (!selected) {
+        alert("Please select a target first.");
+        return;
+    }
+
+    // Current robot orientation from UI
+    const bed = document.getElementById('bedRotation').value;
+    const laser = document.getElementById('laserRotation').value;
+
+    const body = new URLSearchParams();
+    body.append("chosenTarget", selected);
+    body.append("robotPosition", `${bed},${laser}`);
+
+    let result;
+
+    try {
+        const response = await fetch('/moveToTarget', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+            body
+        });
+        result = await response.json();
+    } catch (err) {
+        console.error("Move request failed:", err);
+        alert("Failed to send move command.");
+        return;
+    }
+    if (result.superseded) return;     // a newer target click replaced this one
+    if (!result.success) {
+        alert(result.message || "Move failed.");
+        return;
+    }
+
+    // document.getElementById('bedRotation').value = bedDeg;
+    // document.getElementById('laserRotation').value = laserDeg;
+    document.getElementById('bedRotation').value = result.bed.toFixed(1);
+    document.getElementById('laserRotation').value = result.laser.toFixed(1);
+
+    // await sendValue("bedRotation", bedDeg);
+    // await sendValue("laserRotation", laserDeg);
+    updateOrientationDisplay();
+
+    // Laser pulse, timed on the Pi
+    await fetch(`/laser/pulse?ms=${dwellMs}`, { method: 'POST' });
+}
+
+
+
+// Store robot position in JS (absolute angles)
+let robotPosition = {
+    bed: null,
+    laser: null
+};
+
+// Code to populate drowpdown with turret/globe positions
+async function loadTargets() {
+    const resp = await fetch('/targets');
+    const data = await resp.json();
+
+    // ====== TARGET DROPDOWN ======
+    const selector = document.getElementById('targetSelector');
+    selector.innerHTML = "";
+    const defaultOption = document.createElement('option');
+    defaultOption.value = "";
+    defaultOption.textContent = "-- Choose a target --";
+    selector.appendChild(defaultOption);
+
+    // Turrets
+    if (data.turrets) {
+        const groupTurrets = document.createElement('optgroup');
+        groupTurrets.label = "Turrets";
+
+        for (const [id, vals] of Object.entries(data.turrets)) {
+            const option = document.createElement('option');
+            option.value = `turret_${id}`;
+            option.textContent = `Turret ${id} → θ=${vals.theta.toFixed(3)} rad`;
+            groupTurrets.appendChild(option);
+        }
+        selector.appendChild(groupTurrets);
+    }
+
+    // Globes
+    if (data.globes) {
+        const groupGlobes = document.createElement('optgroup');
+        groupGlobes.label = "Globes";
+
+        data.globes.forEach((g, i) => {
+            const option = document.createElement('option');
+            option.value = `globe_${i+1}`;
+            option.textContent = `Globe ${i+1} → θ=${g.theta.toFixed(3)} rad, z=${g.z.toFixed(1)}`;
+            groupGlobes.appendChild(option);
+        });
+        selector.appendChild(groupGlobes);
+    }
+
+    // Set the robot position dropdown list
+    const robSel = document.getElementById('robotPosSelector');
+    robSel.innerHTML = "";
+    const defaultRobot = document.createElement('option');
+    defaultRobot.value = "";
+    defaultRobot.textContent = "-- Choose turret as robot position --";
+    robSel.appendChild(defaultRobot);
+
+    for (const [id, vals] of Object.entries(data.turrets || {})) {
+        const option = document.createElement('option');
+        option.value = `turret_${id}`;
+        option.textContent = `Turret ${id} (θ=${vals.theta.toFixed(3)} rad)`;
+        robSel.appendChild(option);
+    }
+}
+
+
+// Set the robot position
+async function setRobotPosition() {
+    const sel = document.getElementById('robotPosSelector');
+    const choice = sel.value;
+    if (!choice) return alert("Select a turret position first.");
+
+    const id = choice.split("_")[1];
+
+    // Load JSON so we know the turret positions
+    const data = await (await fetch('/targets')).json();
+    const turret = data.turrets[id];
+
+    if (!turret) return alert("Invalid turret selected.");
+
+    // Convert to degrees (absolute)
+    const bedDeg = turret.theta * 180 / Math.PI;
+    const bedRad = turret.theta;
+    const laserDeg = 0;  // Always zero when robot is at a turret
+
+    try {
+        let response = await fetch('/setRobotPosition', {
+            method: "POST",
+            headers: { "Content-Type": "application/x-www-form-urlencoded" },
+            body: `bed=${bedRad}&laser=${laserDeg}`
+        });
+
+        const result = await response.json();
+        console.log("[SERVER RESPONSE]", result);
+    } catch (err) {
+        console.error("Error sending robot position:", err);
+    }
+
+    alert(`Robot position set to Turret ${id}.\nBed=${bedDeg.toFixed(1)}°, Laser=0°`);
+}
+
+async function startTrial() {
+    // The Pi runs the whole trial (moves, laser dwell, pauses) and
+    // streams one JSON event per line back to us.
+    const body = new URLSearchParams();
+    const budget = document.getElementById('trialBudget').value;
+    if (budget !== "") body.append("budget", budget);
+
+    let response;
+    try {
+        response = await fetch('/trial', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+            body
+        });
+    } catch (err) {
+        console.error("Trial request failed:", err);
+        alert("Autonomous trial aborted.");
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    let targets = [];
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+
+        let newline;
+        while ((newline = buffered.indexOf("\n")) >= 0) {
+            const line = buffered.slice(0, newline);
+            buffered = buffered.slice(newline + 1);
+            if (!line) continue;
+            const ev = JSON.parse(line);
+
+            if (ev.success === false) {
+                alert(ev.message || "Trial failed.");
+                return;
+            }
+            if (ev.event === "start") {
+                targets = ev.targets;
+                if (targets.length === 0) {
+                    alert("No targets found.");
+                    return;
+                }
+            } else if (ev.event === "aimed") {
+                console.log(`▶ Target ${ev.index + 1}/${targets.length}: ${ev.target}`);
+                // Update UI with ACTUAL motor angles returned by backend
+                document.getElementById('bedRotation').value = ev.bed.toFixed(1);
+                document.getElementById('laserRotation').value = ev.laser.toFixed(1);
+                updateOrientationDisplay();
+            } else if (ev.event === "error") {
+                alert(ev.message || "Move failed.");
+                return;
+            } else if (ev.event === "done") {
+                alert(`Autonomous trial complete in ${ev.t.toFixed(1)} s.`);
+                return;
+            }
+        }
+    }
+    alert("Autonomous trial aborted.");
+}
+
+// The page itself is static and cached; the live state comes from /state
+async function loadState() {
+    const st = await (await fetch('/state')).json();
+    document.getElementById('bedRotation').value = st.bedInput;
+    document.getElementById('laserRotation').value = st.laserInput;
+    dwellMs = st.dwellMs;
+    showLaser(st.laserOn);
+    if (!liveTelemetry) {
+        document.getElementById('bedAngleDisplay').textContent = st.bed.toFixed(1);
+        document.getElementById('laserAngleDisplay').textContent = st.laser.toFixed(1);
+    }
+}
+
+loadState();
+loadTargets();
+startTelemetry();
@@ -0,0 +1,81 @@
+# Checks CommandQueue ordering and per-axis coalescing
+#
+# usage: python -m pytest test_commandqueue.py
+
+import threading
+
+import pytest
+
+from commandqueue import CommandQueue, QueueFull, Superseded
+
+AXES = ("bedRotation", "laserRotation")
+
+
+# A started queue whose worker is held until the returned event is set
+def heldQueue(**options):
+    q = CommandQueue(**options)
+    gate = threading.Event()
+    q.start()
+    started = threading.Event()
+    q.submit(lambda: started.set() or gate.wait())
+    started.wait(timeout=5)
+    return q, gate
+
+
+def test_interleaved_axes_coalesce():
+    # The page posts bed and then laser for every click
+    q, gate = heldQueue(maxsize=16, independent=AXES)
+    ran = []
+    futures = []
+    for click in range(10):
+        futures.append(q.submit(ran.append, f"bed->{click}", key="bedRotation"))
+        futures.append(q.submit(ran.append, f"laser->{click}", key="laserRotation"))
+        assert q.pending() <= 2     # one move per axis
+    gate.set()
+    futures[-1].result(timeout=5)
+    assert ran == ["bed->9", "laser->9"]
+    assert all(isinstance(f.exception(timeout=5), Superseded) for f in futures[:-2])
+
+
+def test_unkeyed_command_blocks_coalescing():
+    q, gate = heldQueue(independent=AXES)
+    ran = []
+    q.submit(ran.append, "bed->10", key="bedRotation")
+    q.submit(ran.append, "zero bed")
+    last = q.submit(ran.append, "bed->20", key="bedRotation")
+    gate.set()
+    last.result(timeout=5)
+    assert ran == ["bed->10", "zero bed", "bed->20"]
+
+
+def test_dependent_key_blocks_coalescing():
+    # "aim" moves both axes, so a bed move may not jump over it
+    q, gate = heldQueue(independent=AXES)
+    ran = []
+    q.submit(ran.append, "bed->10", key="bedRotation")
+    q.submit(ran.append, "aim", key="aim")
+    last = q.submit(ran.append, "bed->20", key="bedRotation")
+    gate.set()
+    last.result(timeout=5)
+    assert ran == ["bed->10", "aim", "bed->20"]
+
+
+def test_keys_coalesce_only_when_last_without_independent():
+    q, gate = heldQueue()
+    ran = []
+    q.submit(ran.append, "bed->10", key="bedRotation")
+    q.submit(ran.append, "laser->10", key="laserRotation")
+    q.submit(ran.append, "laser->20", key="laserRotation")
+    last = q.submit(ran.append, "bed->20", key="bedRotation")
+    gate.set()
+    last.result(timeout=5)
+    assert ran == ["bed->10", "laser->20", "bed->20"]
+
+
+def test_queue_full():
+    q, gate = heldQueue(maxsize=2)
+    q.submit(print)
+    q.submit(print)
+    with pytest.raises(QueueFull):
+        q.submit(print)
+    gate.set()
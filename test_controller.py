@@ -0,0 +1,75 @@
+# Checks MotionController word packing and shift scheduling
+#
+# usage: python -m pytest test_controller.py
+
+import os
+os.environ.setdefault("STEPPER_SIM", "1")   # shifter imports a GPIO module; no pins are touched
+
+from controller import SEQ, MotionController
+
+
+class RecordingShifter:
+    """Remembers every word shifted out instead of driving pins."""
+
+    def __init__(self):
+        self.words = []
+
+    def shiftWord(self, dataword, num_bits):
+        self.words.append((dataword, num_bits))
+
+
+def test_axes_fill_chained_registers():
+    c = MotionController()
+    chain = c.addChain(RecordingShifter(), registers=2)
+    axes = [c.addAxis(chain) for _ in range(4)]
+    assert [a.bit_start for a in axes] == [0, 4, 8, 12]
+    assert chain.bits == 16
+
+    for n, axis in enumerate(axes):     # axis n takes n + 1 steps forward
+        for _ in range(n + 1):
+            axis.step(1)
+    expected = sum(SEQ[n + 1] << (4 * n) for n in range(4))
+    assert chain.word.value == expected
+
+    axes[3].step(-1)    # only that axis' nibble changes
+    assert chain.word.value == (expected & ~(0b1111 << 12)) | (SEQ[3] << 12)
+
+
+def test_full_chain_refuses_another_axis():
+    c = MotionController()
+    chain = c.addChain(RecordingShifter(), registers=1)
+    c.addAxis(chain)
+    c.addAxis(chain)
+    try:
+        c.addAxis(chain)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a third axis fit on one register")
+
+
+def test_changed_chain_is_shifted_once_per_pass():
+    c = MotionController(delay=100)
+    front, head = RecordingShifter(), RecordingShifter()
+    chainA = c.addChain(front, registers=2)
+    chainB = c.addChain(head, registers=1)
+    a1, a2 = c.addAxis(chainA), c.addAxis(chainA)
+    b1 = c.addAxis(chainB)
+
+    # Same step count and rate: every pass steps all three axes together
+    c._run(c.plan({a1: 1, a2: -1, b1: 1}))
+    steps = int(a1.steps_per_degree * 1)
+    assert len(front.words) == steps    # both axes on chain A, one shift per pass
+    assert len(head.words) == steps
+    assert all(bits == 16 for _, bits in front.words)
+    assert front.words[-1][0] == chainA.word.value
+    assert a1.angle.value > 0 > a2.angle.value
+
+
+def test_idle_chain_is_not_shifted():
+    c = MotionController(delay=100)
+    front, head = RecordingShifter(), RecordingShifter()
+    a = c.addAxis(c.addChain(front))
+    c.addAxis(c.addChain(head))
+    c._run(c.plan({a: 0.5}))
+    assert front.words and not head.words
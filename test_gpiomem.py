@@ -0,0 +1,53 @@
+# Checks MmapShifter's register write sequence against a file-backed block
+#
+# usage: python -m pytest test_gpiomem.py
+
+import os
+os.environ.setdefault("STEPPER_SIM", "1")   # shifter imports a GPIO module; no pins are touched
+
+import gpiomem
+from gpiomem import GPCLR0, GPFSEL0, GPSET0, MmapShifter
+
+DATA, CLOCK, LATCH = 14, 18, 15
+
+
+def makeShifter(tmp_path):
+    path = tmp_path / "gpiomem"
+    path.write_bytes(bytes(gpiomem.BLOCK_SIZE))
+    return MmapShifter(data=DATA, clock=CLOCK, latch=LATCH, path=str(path))
+
+
+def test_program_byte(tmp_path):
+    s = makeShifter(tmp_path)
+    byte = 0b10100101
+
+    expected = []
+    for i in range(8):      # bit 0 first: data level, clock high, clock low
+        expected.append((GPSET0 if (byte >> i) & 1 else GPCLR0, 1 << DATA))
+        expected += [(GPSET0, 1 << CLOCK), (GPCLR0, 1 << CLOCK)]
+    expected += [(GPSET0, 1 << LATCH), (GPCLR0, 1 << LATCH)]
+
+    stores = s.program(byte, 8)
+    assert len(stores) == 26
+    assert stores == expected
+
+
+def test_program_pads_to_whole_registers(tmp_path):
+    stores = makeShifter(tmp_path).program(0b1, 4)
+    assert len(stores) == 8 * 3 + 2
+    assert stores[:12] == [(GPCLR0, 1 << DATA), (GPSET0, 1 << CLOCK), (GPCLR0, 1 << CLOCK)] * 4
+
+
+def test_pins_are_outputs(tmp_path):
+    s = makeShifter(tmp_path)
+    fsel1 = s.gpio.regs[GPFSEL0 + 1]        # pins 10-19
+    for pin in (DATA, LATCH, CLOCK):
+        assert (fsel1 >> ((pin % 10) * 3)) & 0b111 == gpiomem.FSEL_OUTPUT
+    assert fsel1 == sum(gpiomem.FSEL_OUTPUT << ((pin % 10) * 3) for pin in (DATA, LATCH, CLOCK))
+
+
+def test_shift_word_writes_last_values(tmp_path):
+    s = makeShifter(tmp_path)
+    s.shiftWord(0xff, 8)
+    assert s.gpio.regs[GPSET0] == 1 << LATCH
+    assert s.gpio.regs[GPCLR0] == 1 << LATCH
@@ -0,0 +1,62 @@
+# Checks that a Flusher's trace file decodes back to the rings' events
+#
+# usage: python -m pytest test_ringtrace.py
+
+import threading
+
+import ringtrace
+from ringtrace import INFO, Flusher, Trace
+
+
+def rings():
+    motion = Trace("motion", 0, capacity=16)
+    server = Trace("server", 1, capacity=16, lock=threading.Lock())
+    return motion, server
+
+
+def test_file_keeps_rings_apart(tmp_path):
+    motion, server = rings()
+    path = tmp_path / "trace.bin"
+    flusher = Flusher(str(path), [motion, server])
+    with open(path, "ab") as f:
+        flusher.startRun(f)
+        motion.emit(INFO, ringtrace.MOVE_START, 0, 100, 8.8)
+        server.emit(INFO, ringtrace.REQUEST, server.intern("/state"), 200, 0.001)
+        flusher.flush(f)
+        server.emit(INFO, ringtrace.AIM, server.intern("turret_3"), 0, 10.0, -5.0)
+        motion.emit(INFO, ringtrace.MOVE_END, 0, 100, 8.8, 0.3)
+        flusher.flush(f)
+
+    events = ringtrace.load(str(path))
+    expected = sorted(motion.events() + server.events(), key=lambda e: e["t"])
+    assert events == expected
+    assert [e["trace"] for e in events] == ["motion", "server", "server", "motion"]
+    assert events[1]["route"] == "/state"
+    assert events[2]["target"] == "turret_3"
+
+
+def test_names_restart_with_each_run(tmp_path):
+    path = tmp_path / "trace.bin"
+    for route in ("/first", "/second"):     # two server runs appending to one file
+        motion, server = rings()
+        flusher = Flusher(str(path), [motion, server])
+        with open(path, "ab") as f:
+            flusher.startRun(f)
+            server.emit(INFO, ringtrace.REQUEST, server.intern(route), 200, 0.0)
+            flusher.flush(f)
+
+    assert [e["route"] for e in ringtrace.load(str(path))] == ["/first", "/second"]
+
+
+def test_cut_off_record_is_dropped(tmp_path):
+    motion, server = rings()
+    path = tmp_path / "trace.bin"
+    flusher = Flusher(str(path), [motion, server])
+    with open(path, "ab") as f:
+        flusher.startRun(f)
+        motion.emit(INFO, ringtrace.LASER, 1)
+        motion.emit(INFO, ringtrace.LASER, 0)
+        flusher.flush(f)
+    path.write_bytes(path.read_bytes()[:-5])
+
+    assert [e["on"] for e in ringtrace.load(str(path))] == [1]
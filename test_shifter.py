@@ -0,0 +1,95 @@
+# Checks the pin sequences of Shifter and ParallelShifter on simulated GPIO,
+# by clocking them into a model of daisy-chained 595s
+#
+# usage: python -m pytest test_shifter.py
+
+import os
+os.environ.setdefault("STEPPER_SIM", "1")
+
+import pytest
+
+import simgpio
+from controller import MotionController
+from shifter import ParallelShifter, Shifter
+
+CLOCK, LATCH = 20, 21
+realOutput = simgpio.output
+
+
+class Chains:
+    """595 chains on some data pins, clocked and latched by simgpio.output."""
+
+    def __init__(self, dataPins, registers):
+        self.dataPins = dataPins
+        self.shift = {pin: [0] * (8 * r) for pin, r in zip(dataPins, registers)}
+        self.latched = {pin: None for pin in dataPins}
+        self.clocks = 0
+
+    def output(self, pin, value):
+        channels = pin if isinstance(pin, (list, tuple)) else [pin]
+        values = value if isinstance(value, (list, tuple)) else [value] * len(channels)
+        for channel, level in zip(channels, values):
+            rising = level and not simgpio.pins.get(channel)
+            realOutput(channel, level)
+            if rising and channel == CLOCK:
+                self.clocks += 1
+                for data, outputs in self.shift.items():
+                    outputs.insert(0, simgpio.pins[data])
+                    outputs.pop()
+            elif rising and channel == LATCH:
+                self.latched = {data: list(outputs) for data, outputs in self.shift.items()}
+
+    # Latched outputs of one chain as a word: output k holds bit (bits-1-k),
+    # the same mapping a single Shifter.shiftWord gives
+    def word(self, pin):
+        outputs = self.latched[pin]
+        return sum(bit << (len(outputs) - 1 - k) for k, bit in enumerate(outputs))
+
+
+# Attach chain models to the data pins; simgpio.output then clocks them
+@pytest.fixture
+def pins(monkeypatch):
+    def attach(dataPins, registers):
+        chains = Chains(dataPins, registers)
+        monkeypatch.setattr(simgpio, "output", chains.output)
+        return chains
+    return attach
+
+
+def test_single_chain_word(pins):
+    s = Shifter(data=16, clock=CLOCK, latch=LATCH)
+    chains = pins([16], [1])
+    s.shiftWord(0b10100101, 8)
+    assert chains.clocks == 8
+    assert chains.word(16) == 0b10100101
+
+
+def test_parallel_words_share_one_clock(pins):
+    p = ParallelShifter(data=[16, 19, 26], clock=CLOCK, latch=LATCH)
+    chains = pins([16, 19, 26], [1, 1, 1])
+    p.shiftWords([0x0f, 0xf0, 0xa5], 8)
+    assert chains.clocks == 8       # three chains for the clock pulses of one
+    assert [chains.word(pin) for pin in (16, 19, 26)] == [0x0f, 0xf0, 0xa5]
+
+
+def test_parallel_single_word_zeroes_other_lanes(pins):
+    p = ParallelShifter(data=[16, 19], clock=CLOCK, latch=LATCH)
+    chains = pins([16, 19], [1, 1])
+    p.shiftWords([0xff, 0xff], 8)
+    p.shiftWord(0x3c, 8)
+    assert chains.word(16) == 0x3c
+    assert chains.word(19) == 0
+
+
+def test_short_chain_is_aligned(pins):
+    # Lane 0 has two registers, lane 1 one: shiftOut sends 16 bits to both,
+    # and the short chain must still end up holding exactly its own word
+    p = ParallelShifter(data=[16, 19], clock=CLOCK, latch=LATCH)
+    chains = pins([16, 19], [2, 1])
+    c = MotionController()
+    long, short = c.addChain(p, registers=2), c.addChain(p, registers=1)
+    long.word.value, short.word.value = 0xbeef, 0x5a
+    c.shiftOut(p, long)
+    assert chains.clocks == 16
+    assert chains.word(16) == 0xbeef
+    assert chains.word(19) == 0x5a
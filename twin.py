@@ -0,0 +1,234 @@
+# twin.py
+#
+# Digital twin: faster-than-real-time trial simulation
+#
+# usage: python twin.py [targets.json] [--delay 2500] [--move-overhead-us U]
+#                       [--step-overhead-us U] [--budget S] [--values turret_1:3,...]
+#                       [--robot THETA] [--random N] [--seed S] [--timeline]
+#
+# Runs the server's own runTrial (target order, planner, aimAtTarget, the
+# aiming geometry, laser dwell and pauses) on a virtual clock. Only the
+# edges of the stack are replaced: TwinSteppers move instantly instead of
+# stepping the motors, and runTrial's time, sleep and laser pulse calls go
+# to the virtual clock. A move costs what Stepper.moveTime predicts: the
+# ramped step periods plus the fixed per-move and per-step overheads, which
+# POST /admin/calibrate measures on the Pi (or --move-overhead-us and
+# --step-overhead-us set here). One target layout takes about a millisecond
+# of CPU, so delays, dwell times and orderings can be compared across
+# thousands of random layouts.
+#
+# With a file (default targets.json) it prints the predicted schedule. With
+# --random N it simulates N random layouts and prints the spread of trial
+# durations.
+
+import os
+os.environ.setdefault("STEPPER_SIM", "1")   # no pins are touched, but finalProject imports GPIO
+
+import argparse
+import contextlib
+import json
+import math
+import random
+import time
+
+import finalProject
+from finalProject import Stepper
+
+
+class VirtualClock:
+    """Simulated time [s]; only advances when told to (or slept on).
+
+    Stands in for the time module inside finalProject while a trial runs."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def perf_counter(self):
+        return self.now
+
+    monotonic = perf_counter
+
+    def __getattr__(self, name):    # anything else (time.time, ...) is real
+        return getattr(time, name)
+
+
+class TwinStepper(Stepper):
+    """Stepper whose moves take virtual time and no hardware."""
+
+    def __init__(self, clock, axis, poses):
+        # Twins are not axes on the shift register: take the index of the
+        # axis they stand for and leave the count of real ones alone
+        count, Stepper.num_steppers = Stepper.num_steppers, ("bed", "laser").index(axis)
+        try:
+            super().__init__(None, None)
+        finally:
+            Stepper.num_steppers = count
+        self.clock = clock
+        self.axis = axis            # "bed" or "laser"
+        self.poses = poses          # shared pose timeline, appended on every move
+        self.steps = 0              # steps taken (= shift register updates)
+
+    def goAngle(self, tarAngle):
+        curAngle = self.angle.value
+        self.clock.advance(Stepper.moveTime(curAngle, tarAngle))
+        delta = Stepper.moveDelta(curAngle, tarAngle)
+        numSteps = int(Stepper.steps_per_degree * abs(delta))
+        if numSteps == 0:
+            return
+        sign = 1 if delta > 0 else -1
+        self.angle.value = curAngle + sign * numSteps / Stepper.steps_per_degree
+        self.steps += numSteps
+        self.poses.append(pose(self.clock.now, self.poses[-1], self.axis, self.angle.value))
+
+
+# Timeline entry: a copy of the previous pose with one axis changed
+def pose(t, previous, axis, angle):
+    entry = dict(previous, t=round(t, 6))
+    entry[axis] = round(finalProject.signedAngle(angle), 3)
+    return entry
+
+
+# Point finalProject's clock and laser at the twin while a trial runs
+@contextlib.contextmanager
+def virtualServer(clock, laserOn, pause_s):
+    def setLaser(on):
+        if on and (not laserOn or laserOn[-1][1] is not None):
+            laserOn.append([round(clock.now, 6), None])
+        elif not on and laserOn and laserOn[-1][1] is None:
+            laserOn[-1][1] = round(clock.now, 6)
+
+    def pulseLaser(ms, wait=False):
+        setLaser(True)
+        clock.sleep(ms / 1000)
+        setLaser(False)
+
+    patches = {"time": clock, "setLaser": setLaser, "pulseLaser": pulseLaser,
+               "cancelLaserPulse": lambda: None, "TRIAL_PAUSE_S": pause_s}
+    saved = {name: getattr(finalProject, name) for name in patches}
+    for name, value in patches.items():
+        setattr(finalProject, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(finalProject, name, value)
+
+
+# Simulate one trial by running runTrial on the twin. names picks the
+# targets (default: the trial order), budget/values let the planner choose
+# instead. Times in the result are seconds from the start of the trial.
+def simulateTrial(data, names=None, budget=None, values=None, robot=None,
+                  dwell_s=None, pause_s=None):
+    cpu0 = time.process_time()
+    dwell_s = finalProject.LASER_DWELL_S if dwell_s is None else dwell_s
+    pause_s = finalProject.TRIAL_PAUSE_S if pause_s is None else pause_s
+    if robot is not None:
+        finalProject.Globalangle = robot
+
+    clock = VirtualClock()
+    poses = [{"t": 0.0, "bed": 0.0, "laser": 0.0}]
+    bed = TwinStepper(clock, "bed", poses)
+    laser = TwinStepper(clock, "laser", poses)
+
+    # The same form fields POST /trial takes
+    params = {"dwell_ms": [str(dwell_s * 1000)]}
+    if names is not None:
+        params["targets"] = [",".join(names)]
+    elif budget is not None:
+        params["budget"] = [str(budget)]
+        params["values"] = [",".join(f"{k}:{v}" for k, v in (values or {}).items())]
+
+    events = []
+    laserOn = []
+    with virtualServer(clock, laserOn, pause_s):
+        finalProject.runTrial(params, data, bed, laser, events.append)
+
+    targets = []
+    order = []
+    started = 0.0
+    for event in events:
+        if event["event"] == "start":
+            order = event["targets"]
+        elif event["event"] == "error":
+            targets.append({"target": event.get("target"), "error": event["message"]})
+        elif event["event"] == "skip":
+            targets.append({"target": event["target"], "skipped": True})
+        elif event["event"] == "aimed":
+            targets.append({"target": event["target"], "aimed": event["t"]})
+        elif event["event"] == "fired":
+            targets[-1]["fired"] = event["t"]
+            nextStart = event["t"] + (pause_s if event["index"] < len(order) - 1 else 0)
+            targets[-1]["duration"] = round(nextStart - started, 6)
+            started = nextStart
+
+    return {
+        "order": order,
+        "targets": targets,
+        "total": round(clock.now, 6),
+        "laserOn": [tuple(span) for span in laserOn],
+        "poses": poses,
+        "steps": bed.steps + laser.steps,
+        "cpu_ms": round((time.process_time() - cpu0) * 1000, 3),
+    }
+
+
+# Layout in the targets.json format with targets at random places on the ring
+def randomLayout(rng, turrets=3, globes=3, radius=300.0):
+    return {
+        "turrets": {str(i + 1): {"r": radius, "theta": round(rng.uniform(0, 2 * math.pi), 3)}
+                    for i in range(turrets)},
+        "globes": [{"r": radius, "theta": round(rng.uniform(0, 2 * math.pi), 3),
+                    "z": round(rng.uniform(5, 40), 1)} for _ in range(globes)],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict trial timing without the hardware")
+    parser.add_argument("targets", nargs="?", default="targets.json")
+    parser.add_argument("--delay", type=float, default=Stepper.delay, help="step delay [us]")
+    parser.add_argument("--move-overhead-us", type=float, default=Stepper.move_overhead,
+                        help="fixed cost of each move [us]")
+    parser.add_argument("--step-overhead-us", type=float, default=Stepper.step_overhead,
+                        help="extra time per step on top of the delay [us]")
+    parser.add_argument("--dwell-ms", type=float, default=finalProject.LASER_DWELL_S * 1000)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="let the planner choose targets for this many seconds")
+    parser.add_argument("--values", default="", help="target values, e.g. turret_1:3,globe_2:5")
+    parser.add_argument("--robot", type=float, default=None, help="robot position on the ring [rad]")
+    parser.add_argument("--random", type=int, default=0, help="simulate this many random layouts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeline", action="store_true", help="include the full pose timeline")
+    args = parser.parse_args()
+
+    Stepper.delay = args.delay
+    Stepper.move_overhead = args.move_overhead_us
+    Stepper.step_overhead = args.step_overhead_us
+    Stepper.rampTime.cache_clear()
+    options = dict(budget=args.budget, values=finalProject.parseValues(args.values),
+                   robot=args.robot, dwell_s=args.dwell_ms / 1000)
+
+    if args.random:
+        rng = random.Random(args.seed)
+        totals = []
+        cpu = 0.0
+        for _ in range(args.random):
+            result = simulateTrial(randomLayout(rng), **options)
+            totals.append(result["total"])
+            cpu += result["cpu_ms"]
+        totals.sort()
+        n = len(totals)
+        print(f"{n} layouts, delay {Stepper.delay:g} us: trial time mean {sum(totals) / n:.2f} s, "
+              f"p50 {totals[n // 2]:.2f} s, p95 {totals[min(n - 1, int(0.95 * n))]:.2f} s, "
+              f"max {totals[-1]:.2f} s; {cpu / n:.3f} ms CPU per layout")
+    else:
+        with open(args.targets) as f:
+            result = simulateTrial(json.load(f), **options)
+        if not args.timeline:
+            del result["poses"]
+        print(json.dumps(result, indent=2))